@@ -0,0 +1,228 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+# Microbenchmarks for the helpers that run per chunk or per message.
+#
+#   python benchmarks/bench_helpers.py                 # run and print
+#   python benchmarks/bench_helpers.py --save          # also store as baseline
+#   python benchmarks/bench_helpers.py --compare       # fail on regressions
+#
+# Each benchmark runs `--repeat` rounds and keeps the fastest one, which is
+# the least noisy estimate of what the code itself costs.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config.py refuses to load without credentials; nothing here talks to Telegram
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+os.environ.setdefault("SESSION_STRING", "benchmark")
+
+from pyrogram.enums import MessageEntityType
+from pyrogram.types import MessageEntity
+
+from helpers.files import get_readable_file_size, get_readable_time
+from helpers.msg import getChatMsgID, get_file_name, get_parsed_msg
+from helpers.progress import (
+    PROGRESS_BAR,
+    PROGRESS_SCHEDULER,
+    build_progress_text,
+    progress_for_pyrogram
+)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+class FakeMessage:
+    # Stands in for the progress status message; edits are no-ops
+    def __init__(self, message_id):
+        self.id = message_id
+        self.chat = SimpleNamespace(id=-100123)
+        self._client = SimpleNamespace(name="bench")
+
+    async def edit(self, *args, **kwargs):
+        return self
+
+
+def make_links(count):
+    links = []
+    for i in range(count):
+        if i % 3 == 0:
+            links.append(f"https://t.me/c/1234567890/{i + 1}")
+        elif i % 3 == 1:
+            links.append(f"https://t.me/somechannel/{i + 1}")
+        else:
+            links.append(f"https://t.me/c/1234567890/77/{i + 1}")
+    return links
+
+
+def make_messages():
+    def media(**kwargs):
+        return SimpleNamespace(file_name=kwargs.get("file_name"), is_animated=False, is_video=False)
+
+    empty = dict(document=None, video=None, audio=None, voice=None, video_note=None,
+                 animation=None, sticker=None, photo=None)
+    return [
+        SimpleNamespace(**{**empty, "document": media(file_name="archive.zip")}),
+        SimpleNamespace(**{**empty, "video": media(file_name=None)}),
+        SimpleNamespace(**{**empty, "audio": media(file_name="track.mp3")}),
+        SimpleNamespace(**{**empty, "sticker": media()}),
+        SimpleNamespace(**{**empty, "photo": object()}),
+        SimpleNamespace(**empty),
+    ]
+
+
+def make_caption(entity_count):
+    kinds = [
+        MessageEntityType.BOLD,
+        MessageEntityType.ITALIC,
+        MessageEntityType.CODE,
+        MessageEntityType.UNDERLINE,
+        MessageEntityType.STRIKETHROUGH,
+        MessageEntityType.SPOILER,
+    ]
+    words = [f"word{i}" for i in range(entity_count)]
+    text = " ".join(words)
+    entities = []
+    offset = 0
+    for i, word in enumerate(words):
+        entities.append(MessageEntity(type=kinds[i % len(kinds)], offset=offset, length=len(word)))
+        offset += len(word) + 1
+    return text, entities
+
+
+# name -> (function running one round, operations per round)
+def build_benchmarks(scale):
+    links = make_links(10_000)
+    messages = make_messages()
+    caption, entities = make_caption(200)
+    sizes = [17 * 1024 ** i + i for i in range(6)] * 1000
+    callbacks = int(1_000_000 * scale)
+
+    def bench_build_progress_text():
+        for current in range(0, 50_000):
+            build_progress_text(current, 50_000, "📥 Downloading", PROGRESS_BAR,
+                                "▓", "░", "1.00 MB/s", "10s", "20s")
+
+    def bench_progress_callbacks():
+        async def run():
+            message = FakeMessage(1)
+            start = time.time()
+            total = callbacks
+            for current in range(0, total + 1):
+                await progress_for_pyrogram(current, total, "📥 Downloading", message,
+                                            start, PROGRESS_BAR, "▓", "░")
+            PROGRESS_SCHEDULER.forget(message)
+            if PROGRESS_SCHEDULER.task:
+                PROGRESS_SCHEDULER.task.cancel()
+        asyncio.run(run())
+
+    def bench_get_chat_msg_id():
+        for link in links:
+            getChatMsgID(link)
+
+    def bench_get_file_name():
+        for i in range(20_000):
+            get_file_name(i, messages[i % len(messages)])
+
+    def bench_readable_sizes():
+        for size in sizes:
+            get_readable_file_size(size)
+            get_readable_time(size % 1_000_000)
+
+    def bench_get_parsed_msg():
+        async def run():
+            for _ in range(200):
+                await get_parsed_msg(caption, entities)
+        asyncio.run(run())
+
+    return {
+        "build_progress_text": (bench_build_progress_text, 50_000),
+        "progress_for_pyrogram": (bench_progress_callbacks, callbacks + 1),
+        "getChatMsgID": (bench_get_chat_msg_id, len(links)),
+        "get_file_name": (bench_get_file_name, 20_000),
+        "get_readable_size_time": (bench_readable_sizes, len(sizes)),
+        "get_parsed_msg": (bench_get_parsed_msg, 200),
+    }
+
+
+def run_benchmarks(benchmarks, repeat, only=None):
+    results = {}
+    for name, (func, ops) in benchmarks.items():
+        if only and name not in only:
+            continue
+        func()  # warm-up: imports, caches, first-call costs
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        results[name] = best / ops * 1e9
+        print(f"{name:<26} {results[name]:>12.1f} ns/op")
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'benchmark':<26} {'baseline':>12} {'now':>12} {'change':>9}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"{name:<26} {'-':>12} {now:>12.1f} {'new':>9}")
+            continue
+        change = (now - before) / before
+        marker = "  <-- slower" if change > threshold else ""
+        print(f"{name:<26} {before:>12.1f} {now:>12.1f} {change:>+8.1%}{marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot's hot helpers")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per benchmark (best is kept)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the callback count")
+    parser.add_argument("--only", nargs="*", help="run just these benchmarks")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown that counts as a regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(build_benchmarks(args.scale), max(1, args.repeat), args.only)
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}; run with --save first.")
+            return 1
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            return 1
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+# Cold start benchmark.
+#
+#   python benchmarks/bench_startup.py                  # import time of main.py
+#   python benchmarks/bench_startup.py --live           # time to first command
+#
+# The default mode imports main.py in fresh interpreters (no network) and
+# keeps the fastest run. --live starts the real bot with the credentials in
+# the environment, polls /ready and reports when the bot could answer its
+# first command and when every component was up. Either mode exits non-zero
+# when its target is missed.
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+from urllib.error import URLError, HTTPError
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Component name of the primary bot in /ready (its Client name in main.py)
+BOT_COMPONENT = "media_bot"
+
+
+def child_env(workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    # config.py refuses to load without credentials; importing connects nothing
+    env.setdefault("BOT_TOKEN", "123456:benchmark")
+    env.setdefault("SESSION_STRING", "benchmark")
+    env.setdefault("DATABASE_PATH", os.path.join(workdir, "bench.db"))
+    return env
+
+
+def measure_import(repeat, top):
+    best = float("inf")
+    with tempfile.TemporaryDirectory() as workdir:
+        env = child_env(workdir)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "import main"], cwd=workdir, env=env, check=True)
+            best = min(best, time.perf_counter() - start)
+
+        if top:
+            # -X importtime lines: "import time: self | cumulative | module"
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import main"],
+                cwd=workdir, env=env, check=True, capture_output=True, text=True
+            )
+            rows = []
+            for line in result.stderr.splitlines():
+                parts = line.split("|")
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    rows.append((int(parts[1]), parts[2].strip()))
+            print(f"{'module':<40} {'cumulative':>12}")
+            for cumulative, module in sorted(rows, reverse=True)[:top]:
+                print(f"{module:<40} {cumulative / 1000:>10.1f}ms")
+            print()
+    return best
+
+
+def poll_ready(port, timeout):
+    # Returns ({component: seconds since spawn}, all_ready_after) from /ready
+    spawned = time.perf_counter()
+    seen = {}
+    while time.perf_counter() - spawned < timeout:
+        try:
+            with urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                body = json.load(response)
+        except HTTPError as e:
+            body = json.load(e)  # 503 while starting, same payload
+        except (URLError, OSError, ValueError):
+            body = None
+
+        now = time.perf_counter() - spawned
+        if body:
+            for name, component in body["components"].items():
+                if component["state"] == "ready":
+                    seen.setdefault(name, now)
+                elif component["state"] == "failed":
+                    raise RuntimeError(f"{name} failed to start")
+            if body["ready"]:
+                return seen, now
+        time.sleep(0.05)
+    raise TimeoutError(f"not ready after {timeout}s")
+
+
+def measure_live(port, timeout):
+    env = dict(os.environ, PORT=str(port))
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env)
+    try:
+        return poll_ready(port, timeout)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot's cold start")
+    parser.add_argument("--live", action="store_true", help="start the real bot and poll /ready")
+    parser.add_argument("--repeat", type=int, default=5, help="import runs (best is kept)")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports")
+    parser.add_argument("--port", type=int, default=8181, help="web server port for --live")
+    parser.add_argument("--timeout", type=float, default=120, help="give up on --live after this many seconds")
+    parser.add_argument("--import-target", type=float, default=2.0,
+                        help="seconds importing main.py may take")
+    parser.add_argument("--target", type=float, default=5.0,
+                        help="seconds until the bot answers its first command (--live)")
+    args = parser.parse_args()
+
+    if not args.live:
+        seconds = measure_import(max(1, args.repeat), args.top)
+        print(f"{'import main':<26} {seconds:>10.3f}s  (target {args.import_target:.3f}s)")
+        return 0 if seconds <= args.import_target else 1
+
+    components, all_ready = measure_live(args.port, args.timeout)
+    for name, seconds in sorted(components.items(), key=lambda c: c[1]):
+        print(f"{name:<26} {seconds:>10.3f}s")
+    print(f"{'all components':<26} {all_ready:>10.3f}s")
+
+    first_command = components.get(BOT_COMPONENT, all_ready)
+    print(f"\nTime to first command: {first_command:.3f}s (target {args.target:.3f}s)")
+    return 0 if first_command <= args.target else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
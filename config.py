@@ -19,9 +19,56 @@ class PyroConf(object):
     API_ID = int(getenv("API_ID", "6"))
     API_HASH = getenv("API_HASH", "eb06d4abfb49dc3eeb1aeb98ae0f581e")
     BOT_TOKEN = getenv("BOT_TOKEN")
+    # Extra bots used only for uploads, comma separated, admins in the destination
+    BOT_TOKENS = [t.strip() for t in getenv("BOT_TOKENS", "").split(",") if t.strip()]
     SESSION_STRING = getenv("SESSION_STRING")
+    # Extra user accounts, comma separated, each a member of the source chats
+    SESSION_STRINGS = [s.strip() for s in getenv("SESSION_STRINGS", "").split(",") if s.strip()]
     BOT_START_TIME = time()
 
     MAX_CONCURRENT_DOWNLOADS = int(getenv("MAX_CONCURRENT_DOWNLOADS", "3"))
     BATCH_SIZE = int(getenv("BATCH_SIZE", "10"))
+    # Posts one link range may span, and posts one bulk job or batch may hold
+    MAX_LINK_RANGE = int(getenv("MAX_LINK_RANGE", "10000"))
+    MAX_BULK_LINKS = int(getenv("MAX_BULK_LINKS", "50000"))
     FLOOD_WAIT_DELAY = int(getenv("FLOOD_WAIT_DELAY", "3"))
+    PREFETCH_WINDOW = int(getenv("PREFETCH_WINDOW", "400"))
+    CLONE_CACHE_SIZE = int(getenv("CLONE_CACHE_SIZE", "1024"))
+    CLONE_CACHE_TTL = int(getenv("CLONE_CACHE_TTL", "3600"))
+    CLONE_REPROBE_INTERVAL = int(getenv("CLONE_REPROBE_INTERVAL", "600"))
+    STREAM_UPLOADS = getenv("STREAM_UPLOADS", "True").lower() in ("true", "1", "yes")
+    STREAM_BUFFER_CHUNKS = int(getenv("STREAM_BUFFER_CHUNKS", "8"))
+    STREAM_UPLOAD_WORKERS = int(getenv("STREAM_UPLOAD_WORKERS", "4"))
+    MAX_CONCURRENT_TRANSMISSIONS = int(getenv("MAX_CONCURRENT_TRANSMISSIONS", "4"))
+    DOWNLOAD_PART_CLASSES = getenv("DOWNLOAD_PART_CLASSES", "20:1,200:2,1000:4,0:8")
+    DATABASE_PATH = getenv("DATABASE_PATH", "bot_data.db")
+    JOB_WORKERS = int(getenv("JOB_WORKERS", "4"))
+    FILE_ID_CACHE_SIZE = int(getenv("FILE_ID_CACHE_SIZE", "50000"))
+    MEDIA_TOOL_WORKERS = int(getenv("MEDIA_TOOL_WORKERS", "0"))
+    MEDIA_TOOL_TIMEOUT = int(getenv("MEDIA_TOOL_TIMEOUT", "120"))
+    PROBE_CACHE_SIZE = int(getenv("PROBE_CACHE_SIZE", "256"))
+    PROGRESS_EDITS_PER_SECOND = float(getenv("PROGRESS_EDITS_PER_SECOND", "2"))
+    PROGRESS_TTL = int(getenv("PROGRESS_TTL", "300"))
+    # Extra attempts for an item that failed with a transient error
+    ITEM_RETRIES = int(getenv("ITEM_RETRIES", "2"))
+    RETRY_BASE_DELAY = float(getenv("RETRY_BASE_DELAY", "2"))
+    RETRY_MAX_DELAY = float(getenv("RETRY_MAX_DELAY", "60"))
+    BATCH_RETRY_PASS = getenv("BATCH_RETRY_PASS", "True").lower() in ("true", "1", "yes")
+    # Times a job whose run crashed with a transient error goes back to the queue
+    JOB_RETRIES = int(getenv("JOB_RETRIES", "3"))
+    FLOOD_WAIT_RETRIES = int(getenv("FLOOD_WAIT_RETRIES", "3"))
+    SLEEP_THRESHOLD = int(getenv("SLEEP_THRESHOLD", "10"))
+    DISK_HEADROOM_MB = int(getenv("DISK_HEADROOM_MB", "512"))
+    BATCH_HISTORY_SCAN = getenv("BATCH_HISTORY_SCAN", "True").lower() in ("true", "1", "yes")
+    # Max transfers one user may hold at once (0 = only MAX_CONCURRENT_DOWNLOADS)
+    USER_MAX_CONCURRENT = int(getenv("USER_MAX_CONCURRENT", "0"))
+    # Max jobs one user may have running at once (0 = no limit)
+    USER_MAX_JOBS = int(getenv("USER_MAX_JOBS", "1"))
+    # Fair-share weights, "user_id:weight,..." (everyone else weighs 1)
+    USER_WEIGHTS = getenv("USER_WEIGHTS", "")
+    RESUMABLE_DOWNLOADS = getenv("RESUMABLE_DOWNLOADS", "True").lower() in ("true", "1", "yes")
+    PARTIAL_DOWNLOAD_TTL = int(getenv("PARTIAL_DOWNLOAD_TTL", "86400"))
+    # "text" or "json" (one object per line)
+    LOG_FORMAT = getenv("LOG_FORMAT", "text").lower()
+    # Share of info lines kept per module, "module:rate,..." (e.g. "helpers.files:0.1")
+    LOG_SAMPLING = getenv("LOG_SAMPLING", "")
@@ -0,0 +1,201 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import math
+import asyncio
+from typing import AsyncIterator, Iterable, List, Tuple
+
+from config import PyroConf
+from helpers.metrics import STAGE_SECONDS
+from helpers.ratelimit import RATE_LIMITER
+
+# Telegram accepts at most 200 IDs per messages.getMessages / channels.getMessages call
+GET_MESSAGES_LIMIT = 200
+# Messages per messages.getHistory page
+HISTORY_PAGE = 100
+
+_DONE = object()
+
+
+def chunk_ids(ids: Iterable[int], size: int = GET_MESSAGES_LIMIT) -> List[List[int]]:
+    ids = list(ids)
+    size = max(1, min(size, GET_MESSAGES_LIMIT))
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+class DensityEstimate:
+    # Share of IDs that turn out to hold a message, learned as a batch
+    # resolves. `requested` is for the IDs the batch asked for; `between` for
+    # the IDs inside a scanned span that it did not ask for, which a history
+    # scan walks as well. Both start at the worst case (every ID exists), so
+    # a scan is never chosen on a guess.
+
+    def __init__(self):
+        self.requested = [0, 0]  # [found, asked]
+        self.between = [0, 0]
+
+    @staticmethod
+    def _ratio(counts) -> float:
+        found, asked = counts
+        return found / asked if asked else 1.0
+
+    def observe(self, ids: List[int], found: int) -> None:
+        self.requested[0] += found
+        self.requested[1] += len(ids)
+
+    def observe_span(self, ids: List[int], found: int, walked: int) -> None:
+        self.observe(ids, found)
+        self.between[0] += walked - found
+        self.between[1] += ids[-1] - ids[0] + 1 - len(ids)
+
+    def scan_pages(self, ids: List[int]) -> int:
+        # Expected history pages to walk from ids[-1] down to ids[0]
+        span = ids[-1] - ids[0] + 1
+        expected = len(ids) * self._ratio(self.requested) + (span - len(ids)) * self._ratio(self.between)
+        return max(1, math.ceil(expected / HISTORY_PAGE))
+
+    def should_scan(self, ids: List[int], chunk_size: int) -> bool:
+        return self.scan_pages(ids) < math.ceil(len(ids) / chunk_size)
+
+
+async def fetch_messages_chunk(pool, chat_id, ids: List[int], density: DensityEstimate = None) -> List[Tuple[int, object]]:
+    # One round trip for the whole chunk on whichever user session is
+    # healthiest. A FloodWait benches that session and the chunk moves on to
+    # the next one instead of every ID sleeping on its own.
+    with STAGE_SECONDS.time("fetch"):
+        messages = await pool.call(
+            "fetch", chat_id, "get_messages", chat_id=chat_id, message_ids=ids
+        )
+
+    if not isinstance(messages, list):
+        messages = [messages]
+
+    # get_messages keeps the requested order, but map by ID so a short
+    # answer can never shift messages onto the wrong IDs.
+    by_id = {msg.id: msg for msg in messages if msg is not None}
+    if density is not None:
+        density.observe(ids, sum(1 for msg in by_id.values() if not msg.empty))
+    return [(msg_id, by_id.get(msg_id)) for msg_id in ids]
+
+
+async def scan_history_segment(pool, chat_id, ids: List[int], density: DensityEstimate = None) -> List[Tuple[int, object]]:
+    # Walks the chat history from just above the segment down to its first
+    # ID. Only existing messages come back, in pages of 100, so deleted IDs
+    # cost nothing; the IDs never seen are reported as None.
+    first, last = ids[0], ids[-1]
+
+    async def scan(client):
+        # pool.run spent a fetch token on the first page; every further page
+        # is its own request and takes another token from the same bucket
+        bucket = RATE_LIMITER.bucket(client, "fetch", chat_id)
+        found = {}
+        async for msg in client.get_chat_history(chat_id, offset_id=last + 1):
+            if msg.id < first:
+                break
+            found[msg.id] = msg
+            if len(found) % HISTORY_PAGE == 0:
+                await bucket.acquire()
+        return found
+
+    with STAGE_SECONDS.time("fetch"):
+        found = await pool.run("fetch", chat_id, scan)
+    results = [(msg_id, found.get(msg_id)) for msg_id in ids]
+    if density is not None:
+        density.observe_span(ids, sum(1 for _, msg in results if msg is not None), len(found))
+    return results
+
+
+def plan_segments(ids: Iterable[int], window: int) -> List[List[int]]:
+    # Ascending IDs cut into runs wherever two IDs are more than a page
+    # apart, so a scan never walks such a gap, and runs into window-sized
+    # segments. prefetch_messages decides per segment whether a scan or
+    # get_messages is cheaper.
+    ids = sorted(set(ids))
+    window = max(window, 1)
+    runs = []
+    for msg_id in ids:
+        if runs and msg_id - runs[-1][-1] <= HISTORY_PAGE:
+            runs[-1].append(msg_id)
+        else:
+            runs.append([msg_id])
+    return [run[i:i + window] for run in runs for i in range(0, len(run), window)]
+
+
+async def plan_chunks(ids: Iterable[int], window: int, chunk_size: int, density: DensityEstimate) -> AsyncIterator[Tuple[object, List[int]]]:
+    # (resolver, IDs) in ascending ID order. A segment is scanned only when
+    # its expected history pages are fewer than the get_messages calls it
+    # would take; the rest are pooled into get_messages chunks. Decisions are
+    # made as the batch goes, so each one uses what earlier chunks showed
+    # about how many IDs actually exist.
+    chunk_size = max(1, min(chunk_size, GET_MESSAGES_LIMIT))
+    sparse = []
+    for segment in plan_segments(ids, window):
+        if not density.should_scan(segment, chunk_size):
+            sparse.extend(segment)
+            while len(sparse) >= chunk_size:
+                yield fetch_messages_chunk, sparse[:chunk_size]
+                sparse = sparse[chunk_size:]
+            continue
+        if sparse:
+            yield fetch_messages_chunk, sparse
+            sparse = []
+        yield scan_history_segment, segment
+    if sparse:
+        yield fetch_messages_chunk, sparse
+
+
+async def prefetch_messages(
+    pool,
+    chat_id,
+    ids: Iterable[int],
+    window: int = None,
+    chunk_size: int = GET_MESSAGES_LIMIT,
+    history_scan: bool = None
+) -> AsyncIterator[Tuple[int, object]]:
+    # Yields (message_id, Message or None) in order while a background task
+    # resolves the next chunks. The queue bounds how many resolved messages
+    # may sit ahead of the consumer. With `history_scan` segments where most
+    # IDs turn out to be deleted are read through the chat history instead of
+    # asked for ID by ID, which skips the holes of heavily deleted chats
+    # (see plan_chunks). A chunk that can't be resolved yields the error in
+    # place of each of its messages, and the next chunk carries on.
+    window = window or PyroConf.PREFETCH_WINDOW
+    history_scan = PyroConf.BATCH_HISTORY_SCAN if history_scan is None else history_scan
+    queue = asyncio.Queue(maxsize=max(window, 1))
+
+    density = DensityEstimate()
+
+    async def chunks():
+        if history_scan:
+            async for chunk in plan_chunks(ids, window, chunk_size, density):
+                yield chunk
+        else:
+            for chunk in chunk_ids(ids, chunk_size):
+                yield fetch_messages_chunk, chunk
+
+    async def producer():
+        async for resolve, chunk in chunks():
+            try:
+                resolved = await resolve(pool, chat_id, chunk, density)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                resolved = [(msg_id, e) for msg_id in chunk]
+            for item in resolved:
+                await queue.put(item)
+        await queue.put(_DONE)
+
+    task = asyncio.create_task(producer())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,25 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import sqlite3
+
+from config import PyroConf
+
+_CONNECTIONS = {}
+
+
+def get_connection(path: str = None) -> sqlite3.Connection:
+    # One autocommit connection per database file, shared by every store
+    # (job queue, caches). All callers run on the event loop thread.
+    path = path or PyroConf.DATABASE_PATH
+    conn = _CONNECTIONS.get(path)
+    if conn is None:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _CONNECTIONS[path] = conn
+    return conn
@@ -0,0 +1,37 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+from typing import Optional
+
+from helpers.db import get_connection
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS destinations (
+    user_id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL
+);
+"""
+
+
+class DestinationStore:
+    # Per-user upload destination set with /set. Persisted in SQLite and
+    # mirrored in a dict, so the lookup on every item is a plain dict get.
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.executescript(SCHEMA)
+        self.by_user = dict(self.conn.execute("SELECT user_id, chat_id FROM destinations").fetchall())
+
+    def get(self, user_id: int) -> Optional[int]:
+        return self.by_user.get(user_id)
+
+    def set(self, user_id: int, chat_id: int) -> None:
+        self.conn.execute("REPLACE INTO destinations (user_id, chat_id) VALUES (?, ?)", (user_id, chat_id))
+        self.by_user[user_id] = chat_id
+
+    def clear(self, user_id: int) -> None:
+        self.conn.execute("DELETE FROM destinations WHERE user_id = ?", (user_id,))
+        self.by_user.pop(user_id, None)
+
+
+DESTINATIONS = DestinationStore(get_connection())
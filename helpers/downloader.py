@@ -0,0 +1,216 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import json
+import asyncio
+from time import monotonic
+from typing import List, Optional, Tuple
+
+from config import PyroConf
+from helpers.metrics import TRANSFER_BYTES
+from helpers.msg import get_source_media
+from logger import LOGGER
+
+# stream_media always yields (and is addressed in) chunks of 1 MiB
+CHUNK_SIZE = 1024 * 1024
+
+# Seconds between flushing a resumable download and updating its sidecar
+RESUME_SAVE_INTERVAL = 5
+
+
+def parse_part_classes(spec: str) -> List[Tuple[Optional[int], int]]:
+    # "20:1,200:2,1000:4,0:8" -> files up to 20 MB use 1 part, up to 200 MB
+    # use 2, up to 1000 MB use 4 and anything bigger (0 = no limit) uses 8.
+    classes = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        limit_mb, parts = item.split(":")
+        limit = int(limit_mb) * 1024 * 1024 if int(limit_mb) > 0 else None
+        classes.append((limit, max(1, int(parts))))
+    classes.sort(key=lambda c: float("inf") if c[0] is None else c[0])
+    return classes or [(None, 1)]
+
+
+PART_CLASSES = parse_part_classes(PyroConf.DOWNLOAD_PART_CLASSES)
+
+
+def parts_for_size(file_size: int) -> int:
+    for limit, parts in PART_CLASSES:
+        if limit is None or file_size <= limit:
+            return parts
+    return PART_CLASSES[-1][1]
+
+
+def split_ranges(file_size: int, parts: int) -> List[Tuple[int, int]]:
+    # (first chunk, chunk count) per part, aligned to stream_media chunks
+    total_chunks = (file_size + CHUNK_SIZE - 1) // CHUNK_SIZE
+    parts = max(1, min(parts, total_chunks))
+    base, extra = divmod(total_chunks, parts)
+
+    ranges = []
+    offset = 0
+    for i in range(parts):
+        count = base + (1 if i < extra else 0)
+        ranges.append((offset, count))
+        offset += count
+    return ranges
+
+
+def preallocate(path: str, file_size: int) -> int:
+    # The request folder may have been removed while this download waited
+    # for disk space (a sibling's cleanup found it empty)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.posix_fallocate(fd, 0, file_size)
+    except (AttributeError, OSError):
+        # Not every filesystem supports fallocate; a sparse file still lets
+        # every part write at its own offset.
+        os.ftruncate(fd, file_size)
+    return fd
+
+
+def sidecar_path(file_path: str) -> str:
+    return file_path + ".parts"
+
+
+def load_resume_state(file_path: str, file_unique_id: str, file_size: int) -> Optional[dict]:
+    # The sidecar next to a partial .temp file records which chunks of each
+    # part are safely on disk. It only counts if it describes the same media.
+    temp_path = file_path + ".temp"
+    try:
+        with open(sidecar_path(file_path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        state.get("file_unique_id") != file_unique_id
+        or state.get("file_size") != file_size
+        or not os.path.exists(temp_path)
+        or os.path.getsize(temp_path) != file_size
+    ):
+        LOGGER(__name__).info(f"Discarding partial download of {file_path}: it belongs to other media")
+        discard_partial(file_path)
+        return None
+    return state
+
+
+def save_resume_state(file_path: str, state: dict) -> None:
+    # Written to a temp file and renamed, so a crash never leaves half a sidecar
+    path = sidecar_path(file_path)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def discard_partial(file_path: str) -> None:
+    for path in (file_path + ".temp", sidecar_path(file_path)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _part_bytes(first_chunk: int, done: int, file_size: int) -> int:
+    return max(0, min((first_chunk + done) * CHUNK_SIZE, file_size) - first_chunk * CHUNK_SIZE)
+
+
+async def download_media(client, chat_message, file_path: str, progress=None, progress_args=()):
+    # Downloads `chat_message` into `file_path` by fetching byte ranges over
+    # several connections at once. Each part writes straight into its slot of
+    # a file preallocated to the full size. With RESUMABLE_DOWNLOADS a sidecar
+    # records how far every part got (only after the data is flushed), so a
+    # retry continues a matching partial file instead of starting over.
+    # Returns the final path.
+    media = get_source_media(chat_message)
+    file_size = getattr(media, "file_size", 0) or 0
+    file_unique_id = getattr(media, "file_unique_id", None)
+
+    # Unknown size (or nothing to split): let Pyrogram do a plain download
+    if not file_size:
+        path = await chat_message.download(
+            file_name=file_path,
+            progress=progress,
+            progress_args=progress_args
+        )
+        if path and os.path.exists(path):
+            TRANSFER_BYTES.inc(client.name, "download", amount=os.path.getsize(path))
+        return path
+
+    resumable = PyroConf.RESUMABLE_DOWNLOADS and bool(file_unique_id)
+    state = load_resume_state(file_path, file_unique_id, file_size) if resumable else None
+    if state is None:
+        ranges = split_ranges(file_size, parts_for_size(file_size))
+        state = {
+            "file_unique_id": file_unique_id,
+            "file_size": file_size,
+            "ranges": ranges,
+            "done": [0] * len(ranges),
+        }
+    ranges = [tuple(r) for r in state["ranges"]]
+    done = state["done"]
+
+    temp_path = file_path + ".temp"
+    loop = asyncio.get_running_loop()
+    fd = preallocate(temp_path, file_size)
+    received = sum(_part_bytes(first, done[i], file_size) for i, (first, _) in enumerate(ranges))
+    last_save = monotonic()
+
+    if received:
+        LOGGER(__name__).info(f"Resuming {file_path} at {received} of {file_size} bytes")
+    else:
+        LOGGER(__name__).info(f"Downloading {file_path} ({file_size} bytes) in {len(ranges)} part(s)")
+
+    async def checkpoint():
+        nonlocal last_save
+        last_save = monotonic()
+        snapshot = dict(state, done=list(done))
+        # Data first, then the sidecar that vouches for it
+        await loop.run_in_executor(None, os.fsync, fd)
+        await loop.run_in_executor(None, save_resume_state, file_path, snapshot)
+
+    async def fetch_part(index: int, first_chunk: int, chunk_count: int):
+        nonlocal received
+        start = done[index]
+        position = (first_chunk + start) * CHUNK_SIZE
+        if start >= chunk_count:
+            return
+        async for chunk in client.stream_media(chat_message, offset=first_chunk + start, limit=chunk_count - start):
+            await loop.run_in_executor(None, os.pwrite, fd, chunk, position)
+            position += len(chunk)
+            received += len(chunk)
+            done[index] += 1
+            TRANSFER_BYTES.inc(client.name, "download", amount=len(chunk))
+            if resumable and monotonic() - last_save >= RESUME_SAVE_INTERVAL:
+                await checkpoint()
+            if progress:
+                await progress(received, file_size, *progress_args)
+
+    tasks = [
+        asyncio.create_task(fetch_part(i, first, count))
+        for i, (first, count) in enumerate(ranges)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if resumable:
+            try:
+                await checkpoint()
+            except Exception as e:
+                LOGGER(__name__).warning(f"Could not save resume state for {file_path}: {e}")
+        raise
+    finally:
+        os.close(fd)
+
+    if received != file_size:
+        raise ValueError(f"Download ended at {received} of {file_size} bytes")
+
+    os.replace(temp_path, file_path)
+    discard_partial(file_path)
+    return file_path
@@ -0,0 +1,137 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+from time import time
+from typing import Optional
+
+from pyrogram.errors import BadRequest, FloodWait
+
+from config import PyroConf
+from helpers.db import get_connection
+from helpers.msg import get_source_media
+from helpers.ratelimit import RATE_LIMITER
+from logger import LOGGER
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_ids (
+    bot_id INTEGER NOT NULL,
+    file_unique_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_size INTEGER,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (bot_id, file_unique_id)
+);
+CREATE INDEX IF NOT EXISTS file_ids_last_used ON file_ids (last_used);
+"""
+
+
+class FileIdCache:
+    # Maps a source file_unique_id to the file_id the bot got back when it
+    # first uploaded that media, so a repeat request is sent by reference
+    # without moving a byte. file_ids only work for the bot that created
+    # them, hence the bot_id in the key. The least recently used rows are
+    # evicted past `max_entries`.
+
+    def __init__(self, conn, max_entries: int):
+        self.conn = conn
+        self.max_entries = max(1, max_entries)
+        self.conn.executescript(SCHEMA)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, bot_id: int, file_unique_id: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT file_id FROM file_ids WHERE bot_id = ? AND file_unique_id = ?",
+            (bot_id, file_unique_id)
+        ).fetchone()
+        if not row:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE file_ids SET last_used = ? WHERE bot_id = ? AND file_unique_id = ?",
+            (time(), bot_id, file_unique_id)
+        )
+        return row[0]
+
+    def put(self, bot_id: int, file_unique_id: str, file_id: str, file_size: int = None) -> None:
+        self.conn.execute(
+            "REPLACE INTO file_ids (bot_id, file_unique_id, file_id, file_size, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (bot_id, file_unique_id, file_id, file_size, time())
+        )
+        self._evict()
+
+    def invalidate(self, bot_id: int, file_unique_id: str) -> None:
+        self.invalidations += 1
+        self.conn.execute(
+            "DELETE FROM file_ids WHERE bot_id = ? AND file_unique_id = ?",
+            (bot_id, file_unique_id)
+        )
+
+    def _evict(self) -> None:
+        count = self.conn.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM file_ids WHERE rowid IN "
+                "(SELECT rowid FROM file_ids ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+FILE_ID_CACHE = FileIdCache(get_connection(), PyroConf.FILE_ID_CACHE_SIZE)
+
+
+async def send_cached_copy(bot, chat_message, target_chat_id, caption) -> bool:
+    # Re-sends media the bot already uploaded once. Returns False when there
+    # is no usable cached file_id and the caller has to transfer the file.
+    media = get_source_media(chat_message)
+    file_unique_id = getattr(media, "file_unique_id", None)
+    if not file_unique_id:
+        return False
+
+    if not bot.me:
+        await bot.get_me()
+
+    file_id = FILE_ID_CACHE.get(bot.me.id, file_unique_id)
+    if not file_id:
+        return False
+
+    try:
+        await RATE_LIMITER.call(
+            bot, "send", target_chat_id,
+            bot.send_cached_media, target_chat_id, file_id, caption=caption or ""
+        )
+    except FloodWait:
+        raise
+    except BadRequest as e:
+        # Stale reference (expired, deleted, wrong bot): forget it and transfer
+        LOGGER(__name__).info(f"Cached file_id for {file_unique_id} rejected: {e}")
+        FILE_ID_CACHE.invalidate(bot.me.id, file_unique_id)
+        return False
+
+    LOGGER(__name__).info(f"Sent {file_unique_id} from the file_id cache")
+    return True
+
+
+def remember_upload(bot, chat_message, sent_message) -> None:
+    # Records the file_id Telegram gave the bot for the uploaded copy
+    if not sent_message or not bot.me:
+        return
+    source = get_source_media(chat_message)
+    uploaded = get_source_media(sent_message)
+    if not source or not uploaded or not getattr(source, "file_unique_id", None):
+        return
+    FILE_ID_CACHE.put(
+        bot.me.id,
+        source.file_unique_id,
+        uploaded.file_id,
+        getattr(source, "file_size", None)
+    )
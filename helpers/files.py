@@ -2,26 +2,120 @@
 # Channel: https://t.me/itsSmartDev
 
 import os
+import time
+import shutil
+import asyncio
+from collections import deque
 from typing import Optional
 
+from config import PyroConf
+from helpers.metrics import QUEUE_DEPTH
+from helpers.ratelimit import reply
 from logger import LOGGER
 
 SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
 
-def get_download_path(folder_id: int, filename: str, root_dir: str = "downloads") -> str:
+DOWNLOAD_ROOT = "downloads"
+
+# Waiting downloads re-check the disk at least this often, since other
+# processes can free (or take) space without telling us.
+DISK_RECHECK_INTERVAL = 30
+
+
+def _allocated(path: str) -> int:
+    # Bytes a download already occupies on disk (sparse files count only
+    # the blocks actually written)
+    for candidate in (path + ".temp", path):
+        try:
+            st = os.stat(candidate)
+        except OSError:
+            continue
+        return getattr(st, "st_blocks", 0) * 512 or st.st_size
+    return 0
+
+
+class DiskAdmission:
+    # Reserves each download's size before it starts so concurrent large
+    # files can't fill the disk halfway through. Downloads that don't fit
+    # wait in FIFO order until reservations are released in
+    # cleanup_download(). `headroom` is always left free.
+
+    def __init__(self, root: str, headroom: int):
+        self.root = root
+        self.headroom = headroom
+        self.reservations = {}
+        self.queue = deque()
+        self.changed = asyncio.Event()
+
+    def outstanding(self) -> int:
+        # Reserved bytes not yet written; written ones already show in disk_usage
+        return sum(max(0, size - _allocated(path)) for path, size in self.reservations.items())
+
+    def available(self) -> int:
+        os.makedirs(self.root, exist_ok=True)
+        return shutil.disk_usage(self.root).free - self.headroom - self.outstanding()
+
+    async def reserve(self, path: str, size: int) -> None:
+        if not size or path in self.reservations:
+            return
+
+        # A resumed download's .temp file already holds part of the space
+        needed = max(0, size - _allocated(path))
+        ticket = object()
+        self.queue.append(ticket)
+        QUEUE_DEPTH.inc("disk")
+        try:
+            while self.queue[0] is not ticket or self.available() < needed:
+                if not self.reservations and self.queue[0] is ticket:
+                    # Nothing left to wait for: it will never fit
+                    raise OSError(
+                        f"Not enough disk space for {get_readable_file_size(needed)} "
+                        f"(free: {get_readable_file_size(self.available())})"
+                    )
+                LOGGER(__name__).info(f"Waiting for disk space: {path} needs {get_readable_file_size(needed)}")
+                self.changed.clear()
+                try:
+                    await asyncio.wait_for(self.changed.wait(), DISK_RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            self.reservations[path] = size
+        finally:
+            self.queue.remove(ticket)
+            QUEUE_DEPTH.dec("disk")
+            # The next ticket may fit now
+            self.changed.set()
+
+    def release(self, path: str) -> None:
+        if self.reservations.pop(path, None) is not None:
+            self.changed.set()
+
+    def stats(self) -> dict:
+        return {"reserved": sum(self.reservations.values()), "waiting": len(self.queue)}
+
+
+DISK_ADMISSION = DiskAdmission(DOWNLOAD_ROOT, PyroConf.DISK_HEADROOM_MB * 1024 * 1024)
+
+
+def get_download_path(folder_id: int, filename: str, root_dir: str = DOWNLOAD_ROOT) -> str:
     folder = os.path.join(root_dir, str(folder_id))
     os.makedirs(folder, exist_ok=True)
     return os.path.join(folder, filename)
 
 
-def cleanup_download(path: str) -> None:
+def cleanup_download(path: str, keep_partial: bool = False) -> None:
+    # `keep_partial` leaves an unfinished .temp file and its .parts sidecar
+    # behind so a retry can resume it (see helpers.downloader)
+    DISK_ADMISSION.release(path)
     try:
         LOGGER(__name__).info(f"Cleaning Download: {path}")
         
         if os.path.exists(path):
             os.remove(path)
-        if os.path.exists(path + ".temp"):
-            os.remove(path + ".temp")
+        if keep_partial and os.path.exists(path + ".parts"):
+            return
+        for leftover in (path + ".temp", path + ".parts"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
 
         folder = os.path.dirname(path)
         if os.path.isdir(folder) and not os.listdir(folder):
@@ -31,6 +125,26 @@ def cleanup_download(path: str) -> None:
         LOGGER(__name__).error(f"Cleanup failed for {path}: {e}")
 
 
+def sweep_stale_partials(max_age: float, root_dir: str = DOWNLOAD_ROOT) -> int:
+    # Partial downloads no retry came back for within `max_age` seconds
+    now = time.time()
+    removed = 0
+    for folder, _, files in os.walk(root_dir, topdown=False):
+        for name in files:
+            if not name.endswith((".temp", ".parts")):
+                continue
+            path = os.path.join(folder, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        if folder != root_dir and os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+    return removed
+
+
 def get_readable_file_size(size_in_bytes: Optional[float]) -> str:
     if size_in_bytes is None or size_in_bytes < 0:
         return "0B"
@@ -62,10 +176,19 @@ def get_readable_time(seconds: int) -> str:
     return result
 
 
+class FileTooLarge(Exception):
+    pass
+
+
+def max_file_size(is_premium=False) -> int:
+    return 2 * 2097152000 if is_premium else 2097152000
+
+
 async def fileSizeLimit(file_size, message, action_type="download", is_premium=False):
-    MAX_FILE_SIZE = 2 * 2097152000 if is_premium else 2097152000
+    MAX_FILE_SIZE = max_file_size(is_premium)
     if file_size > MAX_FILE_SIZE:
-        await message.reply(
+        await reply(
+            message,
             f"The file size exceeds the {get_readable_file_size(MAX_FILE_SIZE)} limit and cannot be {action_type}ed."
         )
         return False
@@ -0,0 +1,264 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+from time import time
+from typing import Iterable, List, Optional, Tuple
+
+from config import PyroConf
+from helpers.db import get_connection
+from helpers.metrics import ITEMS_TOTAL
+from logger import LOGGER
+
+# Item states. "downloaded" is a checkpoint between download and upload;
+# everything but the final states is picked up again after a restart.
+ITEM_PENDING = "pending"
+ITEM_CLONED = "cloned"
+ITEM_DOWNLOADED = "downloaded"
+ITEM_UPLOADED = "uploaded"
+ITEM_SKIPPED = "skipped"
+ITEM_FAILED = "failed"
+
+UNFINISHED_ITEM_STATES = (ITEM_PENDING, ITEM_DOWNLOADED)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_CANCELLED = "cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    target_chat_id INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    source_chat TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    stage TEXT,
+    error_class TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS job_items_state ON job_items (job_id, state);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+# Columns added after the first release; databases created before them get
+# them on startup.
+ITEM_COLUMNS = (
+    ("stage", "TEXT"),
+    ("error_class", "TEXT"),
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+class Job:
+    __slots__ = ("id", "kind", "user_id", "chat_id", "message_id", "target_chat_id", "state")
+
+    def __init__(self, id, kind, user_id, chat_id, message_id, target_chat_id, state):
+        self.id = id
+        self.kind = kind
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.target_chat_id = target_chat_id
+        self.state = state
+
+
+class JobItem:
+    __slots__ = ("job_id", "seq", "source_chat", "message_id", "url", "state")
+
+    def __init__(self, job_id, seq, source_chat, message_id, url, state):
+        self.job_id = job_id
+        self.seq = seq
+        # Numeric chat IDs come back as text; keep usernames as they are
+        self.source_chat = int(source_chat) if source_chat.lstrip("-").isdigit() else source_chat
+        self.message_id = message_id
+        self.url = url
+        self.state = state
+
+
+class JobStore:
+    # SQLite-backed queue of submitted links and batch ranges. Every item
+    # state change is committed right away so a restart resumes from the
+    # last checkpoint instead of from the start of the batch.
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.executescript(SCHEMA)
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(job_items)")}
+        for name, definition in ITEM_COLUMNS:
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE job_items ADD COLUMN {name} {definition}")
+
+    def submit(
+        self,
+        kind: str,
+        user_id: int,
+        chat_id: int,
+        message_id: int,
+        target_chat_id: int,
+        items: Iterable[Tuple[object, int, str]]
+    ) -> int:
+        now = time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cur = self.conn.execute(
+                "INSERT INTO jobs (kind, user_id, chat_id, message_id, target_chat_id, state, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, user_id, chat_id, message_id, target_chat_id, JOB_PENDING, now, now)
+            )
+            job_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO job_items (job_id, seq, source_chat, message_id, url, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (job_id, seq, str(source_chat), msg_id, url, ITEM_PENDING, now)
+                    for seq, (source_chat, msg_id, url) in enumerate(items)
+                )
+            )
+        return job_id
+
+    def claim_next(self) -> Optional[Job]:
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            running = "(SELECT COUNT(*) FROM jobs AS r WHERE r.state = ? AND r.user_id = jobs.user_id)"
+            row = self.conn.execute(
+                # Users with the fewest running jobs go first, and none runs
+                # more than USER_MAX_JOBS at once, so one user's queue of
+                # batches can't take every worker; their items share the
+                # transfer slots through the FairScheduler instead
+                "SELECT id, kind, user_id, chat_id, message_id, target_chat_id, state "
+                f"FROM jobs WHERE state = ? AND (? <= 0 OR {running} < ?) ORDER BY {running}, id "
+                "LIMIT 1",
+                (JOB_PENDING, PyroConf.USER_MAX_JOBS, JOB_RUNNING, PyroConf.USER_MAX_JOBS, JOB_RUNNING)
+            ).fetchone()
+            if not row:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                (JOB_RUNNING, time(), row[0])
+            )
+        job = Job(*row)
+        job.state = JOB_RUNNING
+        return job
+
+    def finish_job(self, job_id: int, state: str = JOB_DONE) -> None:
+        self.conn.execute(
+            "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+            (state, time(), job_id)
+        )
+
+    def requeue_interrupted(self) -> int:
+        # Jobs left "running" by a crash or restart go back to the queue
+        cur = self.conn.execute(
+            "UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?",
+            (JOB_PENDING, time(), JOB_RUNNING)
+        )
+        if cur.rowcount:
+            LOGGER(__name__).info(f"Requeued {cur.rowcount} interrupted job(s)")
+        return cur.rowcount
+
+    def requeue_job(self, job_id: int) -> bool:
+        # Back to the queue after a failed run; a job cancelled meanwhile stays so
+        cur = self.conn.execute(
+            "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ? AND state = ?",
+            (JOB_PENDING, time(), job_id, JOB_RUNNING)
+        )
+        return cur.rowcount > 0
+
+    def cancel_all(self) -> int:
+        cur = self.conn.execute(
+            "UPDATE jobs SET state = ?, updated_at = ? WHERE state IN (?, ?)",
+            (JOB_CANCELLED, time(), JOB_PENDING, JOB_RUNNING)
+        )
+        return cur.rowcount
+
+    def is_cancelled(self, job_id: int) -> bool:
+        row = self.conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return not row or row[0] == JOB_CANCELLED
+
+    def unfinished_items(self, job_id: int) -> List[JobItem]:
+        rows = self.conn.execute(
+            "SELECT job_id, seq, source_chat, message_id, url, state FROM job_items "
+            f"WHERE job_id = ? AND state IN ({', '.join('?' * len(UNFINISHED_ITEM_STATES))}) ORDER BY seq",
+            (job_id, *UNFINISHED_ITEM_STATES)
+        ).fetchall()
+        return [JobItem(*row) for row in rows]
+
+    def set_item_state(self, job_id: int, seq: int, state: str, error: str = None) -> None:
+        self.conn.execute(
+            "UPDATE job_items SET state = ?, error = ?, updated_at = ? WHERE job_id = ? AND seq = ?",
+            (state, error, time(), job_id, seq)
+        )
+        if state not in UNFINISHED_ITEM_STATES:
+            ITEMS_TOTAL.inc(state)
+
+    def record_result(self, job_id: int, seq: int, result) -> None:
+        # `result` is a helpers.retry.ItemResult
+        self.conn.execute(
+            "UPDATE job_items SET state = ?, error = ?, stage = ?, error_class = ?, "
+            "attempts = attempts + ?, updated_at = ? WHERE job_id = ? AND seq = ?",
+            (result.state, result.error, result.stage, result.error_class,
+             result.attempts, time(), job_id, seq)
+        )
+        if result.state not in UNFINISHED_ITEM_STATES:
+            ITEMS_TOTAL.inc(result.state)
+
+    def fail_unfinished(self, job_id: int, error: str, error_class: str) -> int:
+        # A job that gave up: whatever it had not finished is marked failed
+        cur = self.conn.execute(
+            "UPDATE job_items SET state = ?, error = ?, error_class = ?, updated_at = ? "
+            f"WHERE job_id = ? AND state IN ({', '.join('?' * len(UNFINISHED_ITEM_STATES))})",
+            (ITEM_FAILED, error, error_class, time(), job_id, *UNFINISHED_ITEM_STATES)
+        )
+        if cur.rowcount:
+            ITEMS_TOTAL.inc(ITEM_FAILED, amount=cur.rowcount)
+        return cur.rowcount
+
+    def failed_items(self, job_id: int, error_classes: Iterable[str]) -> List[JobItem]:
+        error_classes = tuple(error_classes)
+        rows = self.conn.execute(
+            "SELECT job_id, seq, source_chat, message_id, url, state FROM job_items "
+            f"WHERE job_id = ? AND state = ? AND error_class IN ({', '.join('?' * len(error_classes))}) "
+            "ORDER BY seq",
+            (job_id, ITEM_FAILED, *error_classes)
+        ).fetchall()
+        return [JobItem(*row) for row in rows]
+
+    def failure_counts(self, job_id: int) -> dict:
+        rows = self.conn.execute(
+            "SELECT COALESCE(error_class, 'other'), COUNT(*) FROM job_items "
+            "WHERE job_id = ? AND state = ? GROUP BY 1",
+            (job_id, ITEM_FAILED)
+        ).fetchall()
+        return dict(rows)
+
+    def item_counts(self, job_id: int) -> dict:
+        rows = self.conn.execute(
+            "SELECT state, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY state",
+            (job_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def pending_jobs(self) -> int:
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)",
+            (JOB_PENDING, JOB_RUNNING)
+        ).fetchone()
+        return row[0]
+
+
+JOB_STORE = JobStore(get_connection())
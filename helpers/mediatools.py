@@ -0,0 +1,177 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import json
+import asyncio
+from uuid import uuid4
+from collections import OrderedDict
+from asyncio.subprocess import PIPE
+from asyncio import create_subprocess_exec, create_subprocess_shell
+
+from config import PyroConf
+from helpers.metrics import MEDIA_TOOL_TIMEOUTS, MEDIA_TOOLS_RUNNING, PROBE_CACHE_TOTAL, QUEUE_DEPTH, STAGE_SECONDS
+from logger import LOGGER
+
+EMPTY_MEDIA_INFO = (0, None, None, None, None)
+
+# ffprobe/ffmpeg are CPU bound; run at most this many at once and let the
+# rest wait their turn in the semaphore's FIFO queue.
+MEDIA_TOOL_WORKERS = PyroConf.MEDIA_TOOL_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+MEDIA_TOOL_SLOTS = asyncio.Semaphore(MEDIA_TOOL_WORKERS)
+
+# (path, size, mtime_ns) -> get_media_info() result
+PROBE_CACHE = OrderedDict()
+
+
+async def cmd_exec(cmd, shell=False, timeout=None):
+    QUEUE_DEPTH.inc("media_tools")
+    try:
+        await MEDIA_TOOL_SLOTS.acquire()
+    finally:
+        QUEUE_DEPTH.dec("media_tools")
+
+    MEDIA_TOOLS_RUNNING.inc()
+    try:
+        if shell:
+            proc = await create_subprocess_shell(cmd, stdout=PIPE, stderr=PIPE)
+        else:
+            proc = await create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
+
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                proc.communicate(), timeout=timeout or PyroConf.MEDIA_TOOL_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            MEDIA_TOOL_TIMEOUTS.inc()
+            _kill(proc)
+            raise
+        except asyncio.CancelledError:
+            # Never leave a stray ffmpeg running after we stopped waiting
+            _kill(proc)
+            raise
+    finally:
+        MEDIA_TOOLS_RUNNING.dec()
+        MEDIA_TOOL_SLOTS.release()
+
+    try:
+        stdout = stdout.decode().strip()
+    except Exception:
+        stdout = "Unable to decode the response!"
+
+    try:
+        stderr = stderr.decode().strip()
+    except Exception:
+        stderr = "Unable to decode the error!"
+
+    return stdout, stderr, proc.returncode
+
+
+def _kill(proc):
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        pass
+
+
+def _probe_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+async def get_media_info(path):
+    key = _probe_key(path)
+    if key is not None and key in PROBE_CACHE:
+        PROBE_CACHE.move_to_end(key)
+        PROBE_CACHE_TOTAL.inc("hit")
+        return PROBE_CACHE[key]
+    PROBE_CACHE_TOTAL.inc("miss")
+
+    try:
+        with STAGE_SECONDS.time("probe"):
+            result = await cmd_exec([
+                "ffprobe", "-hide_banner", "-loglevel", "error",
+                "-print_format", "json", "-show_format", "-show_streams", path,
+            ])
+    except Exception as e:
+        LOGGER(__name__).error(f"Get Media Info: {e}. File: {path}")
+        return EMPTY_MEDIA_INFO
+
+    if result[0] and result[2] == 0:
+        try:
+            data = json.loads(result[0])
+
+            fields = data.get("format", {})
+            duration = round(float(fields.get("duration", 0)))
+
+            tags = fields.get("tags", {})
+            artist = tags.get("artist") or tags.get("ARTIST") or tags.get("Artist")
+            title = tags.get("title") or tags.get("TITLE") or tags.get("Title")
+
+            width = None
+            height = None
+            for stream in data.get("streams", []):
+                if stream.get("codec_type") == "video":
+                    width = stream.get("width")
+                    height = stream.get("height")
+                    break
+
+            info = (duration, artist, title, width, height)
+        except Exception as e:
+            LOGGER(__name__).error(f"Error parsing media info: {e}")
+            return EMPTY_MEDIA_INFO
+
+        # Only successful probes are cached, so a retry can still succeed
+        if key is not None:
+            PROBE_CACHE[key] = info
+            while len(PROBE_CACHE) > PyroConf.PROBE_CACHE_SIZE:
+                PROBE_CACHE.popitem(last=False)
+        return info
+
+    return EMPTY_MEDIA_INFO
+
+
+async def get_video_thumbnail(video_file, duration):
+    # Every call writes its own file so concurrent uploads never share a
+    # thumbnail; the caller removes it once the upload is done.
+    os.makedirs("Assets", exist_ok=True)
+    output = os.path.join("Assets", f"video_thumb_{uuid4().hex}.jpg")
+
+    if duration is None:
+        duration = (await get_media_info(video_file))[0]
+
+    if not duration:
+        duration = 3
+
+    duration //= 2
+
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-ss", str(duration), "-i", video_file,
+        "-vframes", "1", "-q:v", "2",
+        "-y", output,
+    ]
+
+    try:
+        _, err, code = await cmd_exec(cmd, timeout=60)
+        if code != 0 or not os.path.exists(output):
+            LOGGER(__name__).warning(f"Thumbnail generation failed: {err}")
+            remove_thumbnail(output)
+            return None
+    except Exception as e:
+        LOGGER(__name__).warning(f"Thumbnail generation error: {e}")
+        remove_thumbnail(output)
+        return None
+
+    return output
+
+
+def remove_thumbnail(path):
+    if isinstance(path, str) and os.path.exists(path):
+        try:
+            os.remove(path)
+        except Exception:
+            pass
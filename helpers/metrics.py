@@ -0,0 +1,159 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+from contextlib import contextmanager
+from time import monotonic
+from typing import Dict, List, Tuple
+
+# Minimal Prometheus text-format exporter. Metrics register themselves in
+# REGISTRY on creation; `render()` is served at /metrics by the web server.
+REGISTRY = []
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels) -> None:
+        self.values[self._key(labels)] = value
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels):
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+    def samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in self.values.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label tuple -> [per-bucket counts, sum, count]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        key = self._key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(monotonic() - start, *labels)
+
+    def samples(self):
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+JOBS_TOTAL = Counter("bot_jobs_total", "Jobs finished, by outcome.", ("outcome",))
+ITEMS_TOTAL = Counter("bot_items_total", "Job items finished, by final state.", ("state",))
+ITEM_RETRIES_TOTAL = Counter("bot_item_retries_total", "Item attempts retried, by error class.", ("error_class",))
+CLONE_PATH_TOTAL = Counter("bot_clone_path_total", "Items handled, by the delivery path used.", ("path",))
+TRANSFER_BYTES = Counter(
+    "bot_transfer_bytes_total", "Media bytes moved, by client and direction.", ("client", "direction")
+)
+FLOOD_WAITS = Counter("bot_flood_waits_total", "FloodWaits that reached the rate limiter.", ("method",))
+FLOOD_WAIT_SECONDS = Counter(
+    "bot_flood_wait_seconds_total", "Seconds of FloodWait imposed by Telegram.", ("method",)
+)
+STAGE_SECONDS = Histogram("bot_stage_seconds", "Latency of each pipeline stage.", ("stage",))
+QUEUE_DEPTH = Gauge("bot_queue_depth", "Callers waiting for a concurrency slot.", ("queue",))
+ACTIVE_TRANSFERS = Gauge("bot_active_transfers", "Transfers in progress.", ("direction",))
+MEDIA_TOOLS_RUNNING = Gauge("bot_media_tools_running", "ffprobe/ffmpeg processes running.")
+MEDIA_TOOL_TIMEOUTS = Counter("bot_media_tool_timeouts_total", "ffprobe/ffmpeg runs killed after MEDIA_TOOL_TIMEOUT.")
+PROBE_CACHE_TOTAL = Counter("bot_probe_cache_total", "Media probe cache lookups, by result.", ("result",))
+STARTUP_SECONDS = Gauge(
+    "bot_startup_seconds", "Seconds from process start until each component was ready.", ("component",)
+)
@@ -1,9 +1,20 @@
 # Copyright (C) @TheSmartBisnu
 # Channel: https://t.me/itsSmartDev
 
+import re
+from typing import List, Tuple
+
 from pyrogram.parser import Parser
 from pyrogram.utils import get_channel_id
 
+from config import PyroConf
+
+# t.me post links, optionally ending in a range: t.me/c/123/100-900
+LINK_PATTERN = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:t|telegram)\.me/((?:\w+/){1,3}\d+)(?:-(\d+))?",
+    re.IGNORECASE
+)
+
 
 async def get_parsed_msg(text, entities):
     return Parser.unparse(text, entities or [], is_html=False)
@@ -40,6 +51,55 @@ def getChatMsgID(link: str):
     return chat_id, message_id
 
 
+class LinkLimitExceeded(ValueError):
+    pass
+
+
+def extract_links(text: str, max_range: int = None, max_items: int = None) -> List[Tuple[object, int, str]]:
+    # Every post link and link range in `text`, normalized to https://t.me
+    # URLs and expanded to (chat_id, message_id, url). Duplicates are
+    # dropped; items come out grouped by source chat, in ID order. Raises
+    # LinkLimitExceeded before expanding a range wider than `max_range` or
+    # past `max_items` items in total.
+    max_range = max_range or PyroConf.MAX_LINK_RANGE
+    max_items = max_items or PyroConf.MAX_BULK_LINKS
+    by_chat = {}
+    total = 0
+    for match in LINK_PATTERN.finditer(text or ""):
+        path, range_end = match.group(1), match.group(2)
+        url = f"https://t.me/{path}"
+        try:
+            chat_id, first_id = getChatMsgID(url)
+        except ValueError:
+            continue
+        if isinstance(chat_id, str):
+            # Usernames are case-insensitive: t.me/Foo and t.me/foo are one chat
+            chat_id = chat_id.lower()
+
+        last_id = int(range_end) if range_end else first_id
+        if last_id < first_id:
+            first_id, last_id = last_id, first_id
+        if last_id - first_id + 1 > max_range:
+            raise LinkLimitExceeded(
+                f"The range {first_id}-{last_id} is longer than {max_range} posts."
+            )
+
+        prefix = url.rsplit("/", 1)[0]
+        chat_items = by_chat.setdefault(chat_id, {})
+        before = len(chat_items)
+        for msg_id in range(first_id, last_id + 1):
+            chat_items.setdefault(msg_id, f"{prefix}/{msg_id}")
+        total += len(chat_items) - before
+        if total > max_items:
+            raise LinkLimitExceeded(f"One bulk job can hold at most {max_items} posts.")
+
+    return [
+        (chat_id, msg_id, chat_items[msg_id])
+        for chat_id, chat_items in by_chat.items()
+        for msg_id in sorted(chat_items)
+    ]
+
+
 def get_file_name(message_id: int, chat_message) -> str:
     if chat_message.document:
         return chat_message.document.file_name
@@ -64,3 +124,47 @@ def get_file_name(message_id: int, chat_message) -> str:
         return f"{message_id}.jpg"
     else:
         return f"{message_id}"
+
+
+def get_source_media(chat_message):
+    if not chat_message.media:
+        return None
+    return getattr(chat_message, chat_message.media.value, None)
+
+
+def get_media_metadata(chat_message) -> dict:
+    # Attributes Telegram already knows about the source media, passed on to
+    # the upload so ffprobe/ffmpeg only run when something is missing.
+    media = get_source_media(chat_message)
+    if not media:
+        return {}
+
+    thumbs = getattr(media, "thumbs", None)
+    return {
+        "duration": getattr(media, "duration", None) or None,
+        "width": getattr(media, "width", None) or None,
+        "height": getattr(media, "height", None) or None,
+        "performer": getattr(media, "performer", None),
+        "title": getattr(media, "title", None),
+        "thumb_file_id": thumbs[0].file_id if thumbs else None,
+    }
+
+
+async def download_source_thumb(client, thumb_file_id: str):
+    # Server-side thumbnails are tiny; keep them in memory
+    if not thumb_file_id:
+        return None
+    try:
+        thumb = await client.download_media(thumb_file_id, in_memory=True)
+        thumb.name = "thumb.jpg"
+        thumb.seek(0)
+        return thumb
+    except Exception:
+        return None
+
+
+async def load_media_metadata(client, chat_message) -> dict:
+    metadata = get_media_metadata(chat_message)
+    if metadata and (chat_message.video or chat_message.audio):
+        metadata["thumb"] = await download_source_thumb(client, metadata["thumb_file_id"])
+    return metadata
@@ -0,0 +1,136 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+from time import time
+from typing import Optional
+
+from pyrogram import raw, utils
+
+from helpers.db import get_connection
+from logger import LOGGER
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS peers (
+    account INTEGER NOT NULL,
+    peer_id INTEGER NOT NULL,
+    access_hash INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    username TEXT,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (account, peer_id)
+);
+CREATE INDEX IF NOT EXISTS peers_username ON peers (account, username);
+"""
+
+# Peers pushed back into a client on startup, most recently used first
+WARM_LIMIT = 5000
+
+
+def _input_peer_row(peer) -> Optional[tuple]:
+    # InputPeer -> (marked peer id, access hash, storage type)
+    if isinstance(peer, raw.types.InputPeerChannel):
+        return utils.get_channel_id(peer.channel_id), peer.access_hash, "channel"
+    if isinstance(peer, raw.types.InputPeerUser):
+        return peer.user_id, peer.access_hash, "user"
+    if isinstance(peer, raw.types.InputPeerChat):
+        return -peer.chat_id, 0, "group"
+    return None
+
+
+def _storage_username(storage, username):
+    # Pyrofork's storage keeps every username of a peer (a list), Pyrogram's
+    # a single string; match whichever update_peers this build has.
+    if "usernames" in storage.update_peers.__code__.co_varnames:
+        return [username] if username else []
+    return username
+
+
+class PeerCache:
+    # Access hashes per account, kept across restarts. Session-string
+    # clients start with empty peer storage, so without this the first
+    # message ID of a channel after a deploy fails with PeerIdInvalid and
+    # every username costs a resolve RPC. Hashes are only valid for the
+    # account that received them, so rows are keyed by `client.me.id`: client
+    # names are positions in SESSION_STRINGS / BOT_TOKENS and change when
+    # those lists are reordered.
+
+    def __init__(self, conn):
+        self.conn = conn
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(peers)")}
+        if "client" in columns:
+            # Rows keyed by client name can't be trusted; the cache refills
+            # from the dialogs on the next start
+            self.conn.execute("DROP TABLE peers")
+        self.conn.executescript(SCHEMA)
+        # (account, peer_id) -> (access_hash, username) already stored
+        self.seen = {}
+
+    def remember(self, client, peer_id: int, access_hash: int, peer_type: str, username: str = None) -> None:
+        username = username.lower() if username else None
+        key = (client.me.id, peer_id)
+        if self.seen.get(key) == (access_hash, username):
+            return
+        self.seen[key] = (access_hash, username)
+        self.conn.execute(
+            "REPLACE INTO peers (account, peer_id, access_hash, type, username, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (client.me.id, peer_id, access_hash, peer_type, username, time())
+        )
+
+    async def capture(self, client, chat, username: str = None) -> Optional[int]:
+        # Records how `client` reaches `chat`; after the first time this is a
+        # local storage lookup. Returns the peer id.
+        try:
+            row = _input_peer_row(await client.resolve_peer(chat))
+        except Exception as e:
+            LOGGER(__name__).debug(f"Could not capture peer {chat} for {client.name}: {e}")
+            return None
+        if row is None:
+            return None
+        if username is None and isinstance(chat, str) and not chat.lstrip("-").isdigit():
+            username = chat.lstrip("@")
+        self.remember(client, *row, username=username)
+        return row[0]
+
+    def peer_id_for(self, client, username: str) -> Optional[int]:
+        row = self.conn.execute(
+            "SELECT peer_id FROM peers WHERE account = ? AND username = ?",
+            (client.me.id, username.lstrip("@").lower())
+        ).fetchone()
+        return row[0] if row else None
+
+    async def warm(self, client) -> int:
+        # Pushes the cached peers back into the client's own storage
+        rows = self.conn.execute(
+            "SELECT peer_id, access_hash, type, username FROM peers WHERE account = ? "
+            "ORDER BY last_used DESC LIMIT ?",
+            (client.me.id, WARM_LIMIT)
+        ).fetchall()
+        if not rows:
+            return 0
+        await client.storage.update_peers([
+            (peer_id, access_hash, peer_type, _storage_username(client.storage, username), None)
+            for peer_id, access_hash, peer_type, username in rows
+        ])
+        for peer_id, access_hash, _, username in rows:
+            self.seen[(client.me.id, peer_id)] = (access_hash, username)
+        return len(rows)
+
+    async def warm_from_dialogs(self, client) -> int:
+        # Walking the dialogs stores every joined chat in the client's storage
+        # as a side effect; copy them into the cache for the next start.
+        count = 0
+        try:
+            async for dialog in client.get_dialogs():
+                chat = dialog.chat
+                if await self.capture(client, chat.id, getattr(chat, "username", None)):
+                    count += 1
+        except Exception as e:
+            LOGGER(__name__).warning(f"Dialog warm-up for {client.name} stopped early: {e}")
+        return count
+
+    def stats(self) -> dict:
+        return {"peers": self.conn.execute("SELECT COUNT(*) FROM peers").fetchone()[0]}
+
+
+PEER_CACHE = PeerCache(get_connection())
@@ -0,0 +1,284 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import math
+import time
+import asyncio
+
+from pyrogram.errors import FloodWait, MessageIdInvalid, MessageNotModified
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import PyroConf
+from helpers.files import get_readable_file_size, get_readable_time
+from helpers.ratelimit import RATE_LIMITER
+from logger import LOGGER
+
+# Progress bar template
+PROGRESS_BAR = """
+Percentage: {percentage:.2f}% | {current}/{total}
+Speed: {speed}/s
+Elapsed Time: {elapsed_time}
+Estimated Time Left: {est_time}
+"""
+
+# Weight of the newest sample in the smoothed speed
+SPEED_EWMA_ALPHA = 0.3
+SPEED_SAMPLE_INTERVAL = 1.0
+REFRESH_COOLDOWN = 4
+
+
+def progress_keyboard():
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton("🔄 Refresh", callback_data="refresh_progress")]]
+    )
+
+
+def build_progress_text(
+    current,
+    total,
+    action,
+    template,
+    finish,
+    unfinish,
+    speed_text,
+    elapsed_text,
+    etl_text
+):
+    percentage = (current * 100) / total
+
+    bar_len = 20
+    filled = int(percentage / 100 * bar_len)
+    bar = finish * filled + unfinish * (bar_len - filled)
+
+    current_size = get_readable_file_size(current)
+    total_size = get_readable_file_size(total)
+    text = template.format(
+        percentage=percentage,
+        current=current_size,
+        total=total_size,
+        speed=speed_text,
+        elapsed_time=elapsed_text,
+        est_time=etl_text
+    )
+
+    return f"**{action}**\n{bar}\n{text}"
+
+
+def progressArgs(action: str, progress_message, start_time):
+    return (action, progress_message, start_time, PROGRESS_BAR, "▓", "░")
+
+
+class ProgressRecord:
+    # Everything a chunk callback touches; kept small because thousands of
+    # callbacks per second update it in place.
+    __slots__ = (
+        "message", "action", "current", "total", "start_time",
+        "template", "finish", "unfinish",
+        "speed", "sample_time", "sample_bytes",
+        "updated", "last_edit", "last_refresh", "dirty"
+    )
+
+    def __init__(self, message, action, total, start_time, template, finish, unfinish, now):
+        self.message = message
+        self.action = action
+        self.current = 0
+        self.total = total
+        self.start_time = start_time
+        self.template = template
+        self.finish = finish
+        self.unfinish = unfinish
+        self.speed = 0.0
+        self.sample_time = now
+        self.sample_bytes = 0
+        self.updated = now
+        self.last_edit = 0.0
+        self.last_refresh = 0.0
+        self.dirty = False
+
+    @property
+    def finished(self):
+        return self.current >= self.total
+
+    def min_interval(self):
+        size_mb = self.total / (1024 * 1024)
+        if "Download" in self.action:
+            return 25 if size_mb < 500 else 20
+        return 5 if size_mb < 500 else 10
+
+    def render(self, now):
+        elapsed_time = max(now - self.start_time, 0.1)
+        speed_value = self.speed or (self.current / elapsed_time)
+        speed_text = f"{get_readable_file_size(speed_value)}/s"
+
+        remaining_bytes = self.total - self.current
+        if speed_value > 0:
+            etl_text = get_readable_time(int(remaining_bytes / speed_value))
+        else:
+            etl_text = "0s"
+
+        return build_progress_text(
+            current=self.current,
+            total=self.total,
+            action=self.action,
+            template=self.template,
+            finish=self.finish,
+            unfinish=self.unfinish,
+            speed_text=speed_text,
+            elapsed_text=get_readable_time(int(elapsed_time)),
+            etl_text=etl_text
+        )
+
+
+class ProgressScheduler:
+    # The only place progress messages get edited. Chunk callbacks update
+    # their record; one background task spends PROGRESS_EDITS_PER_SECOND
+    # edits across all chats, finished transfers first and then whichever
+    # message has waited longest. Records that stop receiving callbacks
+    # (failed or abandoned transfers) are dropped after PROGRESS_TTL.
+
+    def __init__(self, edits_per_second: float, ttl: float):
+        self.edit_interval = 1 / max(edits_per_second, 0.1)
+        self.ttl = ttl
+        self.records = {}
+        self.task = None
+
+    @staticmethod
+    def key(message):
+        return (message.chat.id if message.chat else None, message.id)
+
+    def update(self, current, total, action, message, start_time, template, finish, unfinish):
+        now = time.time()
+        key = self.key(message)
+        record = self.records.get(key)
+
+        if record is None or record.total != total or record.action != action:
+            # New transfer on this message (e.g. download finished, upload
+            # began, or another album member reported in). The edit pacing
+            # belongs to the message, so it carries over.
+            previous = record
+            record = ProgressRecord(message, action, total, start_time, template, finish, unfinish, now)
+            if previous is not None:
+                record.last_edit = previous.last_edit
+                record.last_refresh = previous.last_refresh
+            self.records[key] = record
+
+        record.current = current
+        record.updated = now
+        record.dirty = True
+
+        delta_time = now - record.sample_time
+        if delta_time >= SPEED_SAMPLE_INTERVAL:
+            sample = max(current - record.sample_bytes, 0) / delta_time
+            record.speed = sample if not record.speed else (
+                SPEED_EWMA_ALPHA * sample + (1 - SPEED_EWMA_ALPHA) * record.speed
+            )
+            record.sample_time = now
+            record.sample_bytes = current
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def forget(self, message):
+        self.records.pop(self.key(message), None)
+
+    def _pick(self, now):
+        best = None
+        best_rank = None
+        for record in self.records.values():
+            if not record.dirty:
+                continue
+            # Chats waiting out a FloodWait or their edit bucket keep their
+            # record for later, so one chat never stalls the others
+            if not RATE_LIMITER.is_ready(record.message._client, "edit", record.message.chat.id):
+                continue
+            if not record.finished and (now - record.last_edit) < record.min_interval():
+                continue
+            rank = (0 if record.finished else 1, record.last_edit)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = record, rank
+        return best
+
+    def _evict(self, now):
+        for key, record in list(self.records.items()):
+            if (now - record.updated) > self.ttl or (record.finished and not record.dirty):
+                del self.records[key]
+
+    async def edit(self, record, now):
+        record.dirty = False
+        record.last_edit = now
+        try:
+            await RATE_LIMITER.call(
+                record.message._client, "edit", record.message.chat.id,
+                record.message.edit, record.render(now), reply_markup=progress_keyboard(),
+                retries=0
+            )
+        except MessageNotModified:
+            pass
+        except FloodWait:
+            # The chat's edit bucket is paused now; try again once it reopens
+            record.dirty = True
+        except MessageIdInvalid:
+            # The transfer finished and its status message is already gone
+            self.records.pop(self.key(record.message), None)
+        except Exception as e:
+            # Usually the message was deleted; nothing left to update
+            LOGGER(__name__).error(f"Progress Error: {e}")
+            self.records.pop(self.key(record.message), None)
+
+    async def _run(self):
+        while self.records:
+            await asyncio.sleep(self.edit_interval)
+            now = time.time()
+            self._evict(now)
+            record = self._pick(now)
+            if record is not None:
+                await self.edit(record, now)
+
+    async def refresh(self, message):
+        record = self.records.get(self.key(message))
+        if not record:
+            return False, 0
+
+        now = time.time()
+        if (now - record.last_refresh) < REFRESH_COOLDOWN:
+            return False, int(math.ceil(REFRESH_COOLDOWN - (now - record.last_refresh)))
+
+        record.last_refresh = now
+        record.dirty = False
+        record.last_edit = now
+        try:
+            await RATE_LIMITER.call(
+                message._client, "edit", message.chat.id,
+                message.edit, record.render(now), reply_markup=progress_keyboard()
+            )
+        except MessageNotModified:
+            return True, 0
+        except Exception as e:
+            LOGGER(__name__).error(f"Progress Refresh Error: {e}")
+            return False, 0
+
+        return True, 0
+
+    def stats(self):
+        return {"active": len(self.records)}
+
+
+PROGRESS_SCHEDULER = ProgressScheduler(PyroConf.PROGRESS_EDITS_PER_SECOND, PyroConf.PROGRESS_TTL)
+
+
+async def progress_for_pyrogram(
+    current,
+    total,
+    action,
+    message,
+    start_time,
+    template,
+    finish,
+    unfinish
+):
+    # Kept async so Pyrogram awaits it on the loop instead of using a thread
+    PROGRESS_SCHEDULER.update(current, total, action, message, start_time, template, finish, unfinish)
+
+
+async def refresh_progress_message(message):
+    return await PROGRESS_SCHEDULER.refresh(message)
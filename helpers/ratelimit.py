@@ -0,0 +1,161 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from time import monotonic
+
+from pyrogram.errors import FloodWait
+
+from config import PyroConf
+from helpers.metrics import FLOOD_WAIT_SECONDS, FLOOD_WAITS
+from logger import LOGGER
+
+# method class -> (starting rate, ceiling) in calls per second per bucket.
+# Buckets speed up a little after every success and halve on FloodWait,
+# so each one settles just under what Telegram tolerates for that chat.
+METHOD_CLASSES = {
+    "fetch": (5.0, 30.0),
+    "copy": (1.0 / max(PyroConf.FLOOD_WAIT_DELAY, 1), 3.0),
+    "send": (1.0, 3.0),
+    "edit": (1.0, 1.0),
+    # Album members stored with messages.uploadMedia before the album goes
+    # out; nothing is posted, so they don't spend the chat's send budget
+    "upload": (2.0, 5.0),
+}
+
+RATE_INCREASE_STEP = 0.05
+MIN_RATE = 0.05
+IDLE_BUCKET_TTL = 3600
+MAX_BUCKETS = 10000
+
+
+class TokenBucket:
+    __slots__ = ("rate", "max_rate", "tokens", "updated", "paused_until", "last_used")
+
+    def __init__(self, rate: float, max_rate: float):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.updated = monotonic()
+        self.paused_until = 0.0
+        self.last_used = self.updated
+
+    def _refill(self, now):
+        # Capacity of one call keeps the pace even instead of bursty
+        self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            now = monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                self.last_used = now
+                return
+            await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def ready(self, now) -> bool:
+        # Whether `acquire` would return right away
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        return self.tokens >= 1.0
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + RATE_INCREASE_STEP)
+
+    def on_flood(self, seconds: float):
+        # Every coroutine using this bucket waits out the FloodWait, not just
+        # the one that hit it, and the learned rate backs off.
+        self.paused_until = max(self.paused_until, monotonic() + seconds)
+        self.rate = max(MIN_RATE, min(self.rate / 2, 1.0 / max(seconds, 1)))
+        self.tokens = 0.0
+
+
+class RateLimiter:
+    # Token buckets per (client, method class, chat). All Telegram calls that
+    # can FloodWait go through `call`.
+
+    def __init__(self):
+        self.buckets = {}
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0.0
+        # Called with (client, method_class, seconds) on every FloodWait
+        self.listeners = []
+
+    def bucket(self, client, method_class: str, chat) -> TokenBucket:
+        key = (getattr(client, "name", id(client)), method_class, str(chat))
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                self._evict_idle()
+            rate, max_rate = METHOD_CLASSES[method_class]
+            bucket = self.buckets[key] = TokenBucket(rate, max_rate)
+        return bucket
+
+    def is_ready(self, client, method_class: str, chat) -> bool:
+        # True when a call would go out without waiting for its bucket
+        key = (getattr(client, "name", id(client)), method_class, str(chat))
+        bucket = self.buckets.get(key)
+        return bucket is None or bucket.ready(monotonic())
+
+    def _evict_idle(self):
+        now = monotonic()
+        for key, bucket in list(self.buckets.items()):
+            if now - bucket.last_used > IDLE_BUCKET_TTL:
+                del self.buckets[key]
+
+    async def call(self, client, method_class: str, chat, func, *args, retries: int = None, **kwargs):
+        retries = PyroConf.FLOOD_WAIT_RETRIES if retries is None else retries
+        bucket = self.bucket(client, method_class, chat)
+
+        for attempt in range(retries + 1):
+            await bucket.acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except FloodWait as e:
+                self.flood_waits += 1
+                self.flood_wait_seconds += e.value
+                FLOOD_WAITS.inc(method_class)
+                FLOOD_WAIT_SECONDS.inc(method_class, amount=e.value)
+                bucket.on_flood(e.value)
+                for listener in self.listeners:
+                    listener(client, method_class, e.value)
+                LOGGER(__name__).warning(
+                    f"FloodWait {e.value}s on {method_class} to {chat} "
+                    f"({getattr(client, 'name', client)}), bucket now {bucket.rate:.2f}/s"
+                )
+                if attempt >= retries:
+                    raise
+                continue
+            bucket.on_success()
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self.buckets),
+            "flood_waits": self.flood_waits,
+            "flood_wait_seconds": self.flood_wait_seconds,
+        }
+
+
+
+# Status replies, edits and deletes on a message go through the same buckets,
+# so a FloodWait on them waits its turn instead of failing the item
+async def reply(message, *args, **kwargs):
+    return await RATE_LIMITER.call(message._client, "send", message.chat.id, message.reply, *args, **kwargs)
+
+
+async def edit(message, *args, **kwargs):
+    return await RATE_LIMITER.call(message._client, "edit", message.chat.id, message.edit, *args, **kwargs)
+
+
+async def delete(message):
+    return await RATE_LIMITER.call(message._client, "edit", message.chat.id, message.delete)
+
+
+RATE_LIMITER = RateLimiter()
@@ -0,0 +1,106 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import random
+import asyncio
+
+from pyrogram.errors import (
+    FloodWait,
+    FileReferenceExpired,
+    FileReferenceInvalid,
+    Forbidden,
+    ChatAdminRequired,
+    ChannelPrivate,
+    UserNotParticipant,
+    PeerIdInvalid,
+    MessageIdInvalid,
+    ChannelInvalid,
+    UsernameInvalid,
+    UsernameNotOccupied,
+    InternalServerError
+)
+
+from config import PyroConf
+from helpers.files import FileTooLarge
+from helpers.jobs import ITEM_PENDING, ITEM_FAILED
+
+# Error classes recorded with failed items
+ERROR_FLOOD_WAIT = "flood_wait"
+ERROR_TIMEOUT = "timeout"
+ERROR_FILE_REFERENCE = "file_reference_expired"
+ERROR_NETWORK = "network"
+ERROR_PERMISSION = "permission"
+ERROR_NOT_FOUND = "not_found"
+ERROR_TOO_LARGE = "too_large"
+ERROR_PARTIAL = "partial"
+ERROR_OTHER = "other"
+
+# Worth another attempt: the same request can succeed a little later
+RETRYABLE_ERRORS = (ERROR_FLOOD_WAIT, ERROR_TIMEOUT, ERROR_FILE_REFERENCE, ERROR_NETWORK)
+
+class PartialDelivery(Exception):
+    # Some of an album went out and some did not. Not retried: another
+    # attempt would send the delivered part a second time.
+    pass
+
+
+# First match wins. KeyError is what Pyrogram raises for a peer the session
+# has never met, i.e. a chat the account is not in.
+_CLASSES = (
+    (FloodWait, ERROR_FLOOD_WAIT),
+    ((FileReferenceExpired, FileReferenceInvalid), ERROR_FILE_REFERENCE),
+    ((asyncio.TimeoutError, TimeoutError), ERROR_TIMEOUT),
+    ((ConnectionError, InternalServerError), ERROR_NETWORK),
+    ((ChatAdminRequired, ChannelPrivate, UserNotParticipant, PeerIdInvalid, Forbidden, KeyError), ERROR_PERMISSION),
+    ((MessageIdInvalid, ChannelInvalid, UsernameInvalid, UsernameNotOccupied), ERROR_NOT_FOUND),
+    (FileTooLarge, ERROR_TOO_LARGE),
+    (PartialDelivery, ERROR_PARTIAL),
+)
+
+
+def classify(error: BaseException) -> str:
+    for types, error_class in _CLASSES:
+        if isinstance(error, types):
+            return error_class
+    return ERROR_OTHER
+
+
+def backoff_delay(attempt: int, minimum: float = 0.0) -> float:
+    # Exponential backoff with jitter: attempt 0 waits up to RETRY_BASE_DELAY,
+    # each further one doubles that, capped at RETRY_MAX_DELAY. The random
+    # half keeps a batch of items that failed together from retrying in step.
+    delay = min(PyroConf.RETRY_MAX_DELAY, PyroConf.RETRY_BASE_DELAY * 2 ** attempt)
+    # `minimum` is a FloodWait's wait: never earlier than Telegram allows
+    return max(random.uniform(delay / 2, delay), minimum)
+
+
+class ItemResult:
+    # Outcome of one item: the final state, and for failures the stage that
+    # failed (fetch, clone, stream, download, upload, send) and why.
+    # `partials` collects the download paths left on disk for a resume.
+    __slots__ = ("state", "stage", "error_class", "error", "retry_after", "attempts", "partials")
+
+    def __init__(self):
+        self.state = ITEM_PENDING
+        self.stage = None
+        self.error_class = None
+        self.error = None
+        self.retry_after = 0
+        self.attempts = 0
+        self.partials = set()
+
+    def reset(self) -> None:
+        # Before another attempt; the attempt count and partials carry on
+        self.state = ITEM_PENDING
+        self.stage = self.error_class = self.error = None
+        self.retry_after = 0
+
+    def fail(self, error: BaseException) -> None:
+        self.state = ITEM_FAILED
+        self.error_class = classify(error)
+        self.error = str(error) or type(error).__name__
+        self.retry_after = error.value if isinstance(error, FloodWait) else 0
+
+    @property
+    def retryable(self) -> bool:
+        return self.error_class in RETRYABLE_ERRORS
@@ -0,0 +1,153 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from helpers.metrics import QUEUE_DEPTH
+
+
+def parse_user_weights(spec: str) -> Dict[int, float]:
+    # "12345:2,67890:0.5" -> {12345: 2.0, 67890: 0.5}
+    weights = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        user_id, weight = item.split(":")
+        weights[int(user_id)] = max(float(weight), 0.01)
+    return weights
+
+
+class UserQueue:
+    __slots__ = ("waiters", "running", "finish")
+
+    def __init__(self):
+        self.waiters = deque()
+        self.running = 0
+        # Virtual time at which this user's last granted slot "finishes"
+        self.finish = 0.0
+
+
+class FairScheduler:
+    # Weighted fair queuing of transfer slots between users. Every user has
+    # their own FIFO of waiting items; when a slot frees up it goes to the
+    # waiting user with the smallest virtual finish time, and each grant
+    # advances that time by 1/weight. A user with 20,000 queued posts
+    # therefore gets their share, not every slot. `per_user` caps how many
+    # slots one user may hold at once (0 = only the global limit).
+
+    def __init__(self, slots: int, per_user: int = 0, weights: Dict[int, float] = None):
+        self.slots = max(1, slots)
+        self.per_user = per_user
+        self.weights = weights or {}
+        self.users: Dict[int, UserQueue] = {}
+        self.running = 0
+        self.vtime = 0.0
+
+    def _queue(self, user_id) -> UserQueue:
+        queue = self.users.get(user_id)
+        if queue is None:
+            queue = self.users[user_id] = UserQueue()
+        return queue
+
+    def _eligible(self, queue: UserQueue) -> bool:
+        return bool(queue.waiters) and (not self.per_user or queue.running < self.per_user)
+
+    def _dispatch(self):
+        while self.running < self.slots:
+            candidates = [(uid, q) for uid, q in self.users.items() if self._eligible(q)]
+            if not candidates:
+                return
+            user_id, queue = min(candidates, key=lambda c: c[1].finish)
+            waiter = queue.waiters.popleft()
+            if waiter.done():
+                # Cancelled while waiting
+                continue
+
+            # Users idle for a while start from "now", not with banked credit
+            start = max(queue.finish, self.vtime)
+            queue.finish = start + 1 / self.weights.get(user_id, 1.0)
+            self.vtime = start
+            queue.running += 1
+            self.running += 1
+            waiter.set_result(None)
+
+    def _forget_if_idle(self, user_id):
+        # Waiters cancelled while queued stay in the deque until dispatched;
+        # drop them so a user with nothing left to run is forgotten
+        queue = self.users.get(user_id)
+        if queue is None:
+            return
+        if any(w.done() for w in queue.waiters):
+            queue.waiters = deque(w for w in queue.waiters if not w.done())
+        if not queue.running and not queue.waiters:
+            del self.users[user_id]
+
+    def _release(self, user_id):
+        queue = self.users[user_id]
+        queue.running -= 1
+        self.running -= 1
+        self._forget_if_idle(user_id)
+        self._dispatch()
+
+    def _take(self, user_id):
+        # Holds a slot without queueing, to balance a release that follows
+        queue = self._queue(user_id)
+        queue.running += 1
+        self.running += 1
+
+    async def _acquire(self, user_id):
+        queue = self._queue(user_id)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.waiters.append(waiter)
+        QUEUE_DEPTH.inc("downloads")
+        try:
+            self._dispatch()
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we were cancelled: hand the slot back
+                self._release(user_id)
+            else:
+                waiter.cancel()
+                self._forget_if_idle(user_id)
+            raise
+        finally:
+            QUEUE_DEPTH.dec("downloads")
+
+    @asynccontextmanager
+    async def slot(self, user_id):
+        await self._acquire(user_id)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    @asynccontextmanager
+    async def released(self, user_id):
+        # Inside slot(): gives the slot back for the duration, e.g. while an
+        # album's members queue for slots of their own, and waits for one
+        # again afterwards. When unwinding, the slot is taken back without
+        # queueing, since the enclosing slot() releases it right away.
+        self._release(user_id)
+        try:
+            yield
+        except BaseException:
+            self._take(user_id)
+            raise
+        try:
+            await self._acquire(user_id)
+        except asyncio.CancelledError:
+            self._take(user_id)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": sum(
+                sum(1 for w in q.waiters if not w.done()) for q in self.users.values()
+            ),
+            "users": len(self.users),
+        }
@@ -0,0 +1,107 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+from contextlib import contextmanager
+from time import monotonic
+
+from pyrogram.errors import FloodWait
+
+from config import PyroConf
+from helpers.ratelimit import RATE_LIMITER
+from logger import LOGGER
+
+
+class UserSession:
+    __slots__ = ("client", "benched_until", "in_flight", "flood_waits")
+
+    def __init__(self, client):
+        self.client = client
+        self.benched_until = 0.0
+        self.in_flight = 0
+        self.flood_waits = 0
+
+    def healthy(self, now) -> bool:
+        return self.benched_until <= now
+
+
+class SessionPool:
+    # Clients sharing one kind of work: the user accounts that read from the
+    # source chats, or the bots that upload. Work goes to the healthy client
+    # with the fewest items in flight; one that hits a FloodWait is benched
+    # until the wait expires while the others carry on. A Message stays bound
+    # to the session that fetched it (file references are per account), so
+    # downloads use `chat_message._client`.
+
+    def __init__(self, clients):
+        self.sessions = [UserSession(client) for client in clients]
+        self.by_client = {id(s.client): s for s in self.sessions}
+        RATE_LIMITER.listeners.append(self.on_flood)
+
+    @property
+    def clients(self):
+        return [s.client for s in self.sessions]
+
+    def session(self, client) -> UserSession:
+        return self.by_client.get(id(client))
+
+    def is_benched(self, client) -> bool:
+        session = self.session(client)
+        return session is not None and not session.healthy(monotonic())
+
+    def pick(self):
+        now = monotonic()
+        healthy = [s for s in self.sessions if s.healthy(now)]
+        if healthy:
+            return min(healthy, key=lambda s: (s.in_flight, s.flood_waits)).client
+
+        # Everyone is benched: the one back soonest; its paused buckets make
+        # the caller wait out the rest of the FloodWait.
+        return min(self.sessions, key=lambda s: s.benched_until).client
+
+    @contextmanager
+    def lease(self, client):
+        session = self.session(client)
+        if session is None:
+            yield client
+            return
+        session.in_flight += 1
+        try:
+            yield client
+        finally:
+            session.in_flight -= 1
+
+    def on_flood(self, client, method_class: str, seconds: float):
+        session = self.session(client)
+        if session is None:
+            return
+        session.flood_waits += 1
+        session.benched_until = max(session.benched_until, monotonic() + seconds)
+        if len(self.sessions) > 1:
+            LOGGER(__name__).warning(f"Benching {client.name} for {seconds}s after a FloodWait on {method_class}")
+
+    async def call(self, method_class: str, chat, method: str, *args, **kwargs):
+        # Runs `client.<method>` on a healthy session. A FloodWait benches that
+        # session and the call moves on to the next one instead of waiting.
+        return await self.run(
+            method_class, chat, lambda client: getattr(client, method)(*args, **kwargs)
+        )
+
+    async def run(self, method_class: str, chat, func):
+        # Like `call`, for work that needs more than one method: `func` gets
+        # the chosen client and returns the awaitable to run.
+        attempts = PyroConf.FLOOD_WAIT_RETRIES + len(self.sessions)
+        for attempt in range(attempts):
+            client = self.pick()
+            try:
+                return await RATE_LIMITER.call(client, method_class, chat, func, client, retries=0)
+            except FloodWait:
+                if attempt >= attempts - 1:
+                    raise
+
+    def stats(self) -> dict:
+        now = monotonic()
+        return {
+            "sessions": len(self.sessions),
+            "healthy": sum(1 for s in self.sessions if s.healthy(now)),
+            "flood_waits": sum(s.flood_waits for s in self.sessions),
+        }
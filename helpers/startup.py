@@ -0,0 +1,64 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from time import time
+from typing import Awaitable, Dict
+
+from config import PyroConf
+from helpers.metrics import STARTUP_SECONDS
+from logger import LOGGER
+
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    # Startup progress of each component (web server, bot, user sessions,
+    # upload lanes, job workers). Components start concurrently and report
+    # in as they come up; /ready answers 503 until all of them have.
+    # Seconds are counted from process start (PyroConf.BOT_START_TIME).
+
+    def __init__(self):
+        self.components: Dict[str, str] = {}
+        self.seconds: Dict[str, float] = {}
+
+    def expect(self, *names: str) -> None:
+        for name in names:
+            self.components.setdefault(name, STARTING)
+
+    def mark(self, name: str, state: str = READY) -> None:
+        self.components[name] = state
+        self.seconds[name] = time() - PyroConf.BOT_START_TIME
+        if state == READY:
+            STARTUP_SECONDS.set(self.seconds[name], name)
+            LOGGER(__name__).info(f"{name} ready after {self.seconds[name]:.2f}s")
+
+    async def start(self, name: str, awaitable: Awaitable):
+        self.expect(name)
+        try:
+            result = await awaitable
+        except BaseException as e:
+            self.mark(name, FAILED)
+            if not isinstance(e, asyncio.CancelledError):
+                LOGGER(__name__).error(f"{name} failed to start: {e}")
+            raise
+        self.mark(name)
+        return result
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.components) and all(state == READY for state in self.components.values())
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "components": {
+                name: {"state": state, "seconds": round(self.seconds.get(name, 0.0), 3)}
+                for name, state in self.components.items()
+            },
+        }
+
+
+STARTUP = Readiness()
@@ -0,0 +1,100 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+from collections import OrderedDict
+from time import monotonic
+from typing import List, Optional, Tuple
+
+from config import PyroConf
+
+# Clone paths in the order handle_download probes them:
+# user = User -> Destination, bot = Bot -> Destination,
+# relay = User -> Bot -> Destination, download = Download & Upload
+STRATEGIES = ("user", "bot", "relay", "download")
+
+
+class CloneStrategyCache:
+    # Remembers which clone path last worked for a
+    # (source chat, destination chat, media group?) pair so later posts skip
+    # the attempts that are known to fail. Entries expire after `ttl`
+    # seconds, the least recently used entry is evicted past `max_entries`,
+    # and every `reprobe_after` seconds one lookup runs the full probe again
+    # in case permissions changed.
+
+    def __init__(self, max_entries: int, ttl: float, reprobe_after: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.reprobe_after = reprobe_after
+        # key -> [strategy, expires_at, reprobe_at]
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.reprobes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(source_chat, destination_chat, is_media_group: bool) -> Tuple:
+        return (str(source_chat), str(destination_chat), bool(is_media_group))
+
+    def lookup(self, key) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = monotonic()
+        if now >= entry[1]:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        if now >= entry[2]:
+            # Let this caller probe from the top; everyone else keeps using
+            # the cached path until it reports back.
+            entry[2] = now + self.reprobe_after
+            self.reprobes += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def plan(self, key) -> List[str]:
+        cached = self.lookup(key)
+        if cached is None:
+            return list(STRATEGIES)
+        return [cached] + [s for s in STRATEGIES if s != cached]
+
+    def record(self, key, strategy: str) -> None:
+        now = monotonic()
+        entry = self._entries.get(key)
+        # Confirming the same path must not push the re-probe further out,
+        # or a busy pair would never get re-probed.
+        reprobe_at = entry[2] if entry and entry[0] == strategy else now + self.reprobe_after
+        self._entries[key] = [strategy, now + self.ttl, reprobe_at]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_failure(self, key, strategy: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == strategy:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reprobes": self.reprobes,
+            "evictions": self.evictions,
+        }
+
+
+CLONE_STRATEGY_CACHE = CloneStrategyCache(
+    max_entries=PyroConf.CLONE_CACHE_SIZE,
+    ttl=PyroConf.CLONE_CACHE_TTL,
+    reprobe_after=PyroConf.CLONE_REPROBE_INTERVAL,
+)
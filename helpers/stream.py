@@ -0,0 +1,341 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from hashlib import md5
+from typing import Optional
+
+from pyrogram import raw, types, utils
+
+from config import PyroConf
+from helpers.metrics import TRANSFER_BYTES
+from helpers.msg import download_source_thumb, get_media_metadata, get_source_media
+from helpers.ratelimit import RATE_LIMITER
+from logger import LOGGER
+
+# Telegram upload parts must be 512 KiB; files above 10 MiB use the "big" API
+PART_SIZE = 512 * 1024
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+
+DEFAULT_MIME_TYPES = {
+    "video": "video/mp4",
+    "audio": "audio/mpeg",
+    "document": "application/octet-stream",
+}
+
+
+def can_stream(chat_message, media_type: str) -> bool:
+    if not PyroConf.STREAM_UPLOADS:
+        return False
+
+    media = get_source_media(chat_message)
+    if not media or not getattr(media, "file_size", 0):
+        return False
+
+    # Without duration/size from the source, ffprobe and ffmpeg need a
+    # seekable file on disk, so those videos keep the download path.
+    if media_type == "video":
+        return bool(media.duration and media.width and media.height)
+
+    return True
+
+
+async def _upload_parts(bot, source, file_size: int, file_name: str, progress=None, progress_args=()):
+    # Pulls chunks from `source` (an async iterator of bytes) into a bounded
+    # buffer and pushes 512 KiB parts to Telegram while the download is still
+    # running. Returns the raw InputFile to attach to a message.
+    is_big = file_size > BIG_FILE_THRESHOLD
+    total_parts = (file_size + PART_SIZE - 1) // PART_SIZE
+    file_id = bot.rnd_id()
+    md5_sum = md5() if not is_big else None
+
+    buffer = asyncio.Queue(maxsize=max(1, PyroConf.STREAM_BUFFER_CHUNKS))
+    upload_slots = asyncio.Semaphore(max(1, PyroConf.STREAM_UPLOAD_WORKERS))
+    pending = set()
+    errors = []
+    uploaded = 0
+
+    async def producer():
+        try:
+            async for chunk in source:
+                await buffer.put(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await buffer.put(e)
+            return
+        await buffer.put(None)
+
+    async def save_part(part_no: int, data: bytes):
+        nonlocal uploaded
+        try:
+            if is_big:
+                rpc = raw.functions.upload.SaveBigFilePart(
+                    file_id=file_id,
+                    file_part=part_no,
+                    file_total_parts=total_parts,
+                    bytes=data
+                )
+            else:
+                rpc = raw.functions.upload.SaveFilePart(
+                    file_id=file_id,
+                    file_part=part_no,
+                    bytes=data
+                )
+            await bot.invoke(rpc)
+            uploaded += len(data)
+            TRANSFER_BYTES.inc(bot.name, "upload", amount=len(data))
+            if progress:
+                await progress(uploaded, file_size, *progress_args)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            upload_slots.release()
+
+    async def submit(part_no: int, data: bytes):
+        await upload_slots.acquire()
+        task = asyncio.create_task(save_part(part_no, data))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    feeder = asyncio.create_task(producer())
+    part_no = 0
+    received = 0
+    carry = bytearray()
+
+    try:
+        while True:
+            chunk = await buffer.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if chunk is None:
+                break
+
+            received += len(chunk)
+            carry.extend(chunk)
+            while len(carry) >= PART_SIZE:
+                part = bytes(carry[:PART_SIZE])
+                del carry[:PART_SIZE]
+                if md5_sum:
+                    md5_sum.update(part)
+                await submit(part_no, part)
+                part_no += 1
+
+            # Surface a failed part early instead of streaming the rest for nothing
+            if errors:
+                raise errors[0]
+
+        if carry:
+            part = bytes(carry)
+            if md5_sum:
+                md5_sum.update(part)
+            await submit(part_no, part)
+            part_no += 1
+
+        await asyncio.gather(*pending)
+        if errors:
+            raise errors[0]
+    finally:
+        for task in list(pending):
+            task.cancel()
+        if not feeder.done():
+            feeder.cancel()
+            try:
+                await feeder
+            except asyncio.CancelledError:
+                pass
+
+    if received != file_size:
+        raise ValueError(f"Stream ended at {received} of {file_size} bytes")
+
+    if is_big:
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=file_name)
+    return raw.types.InputFile(
+        id=file_id,
+        parts=total_parts,
+        name=file_name,
+        md5_checksum=md5_sum.hexdigest()
+    )
+
+
+async def _metered(client, source):
+    async for chunk in source:
+        TRANSFER_BYTES.inc(client.name, "download", amount=len(chunk))
+        yield chunk
+
+
+async def _upload_source_thumb(bot, user, chat_message) -> Optional[object]:
+    # The server already generated a thumbnail for the source video/audio;
+    # pull it into memory instead of cutting a frame with ffmpeg.
+    thumb = await download_source_thumb(user, get_media_metadata(chat_message).get("thumb_file_id"))
+    if not thumb:
+        return None
+    try:
+        return await bot.save_file(thumb)
+    except Exception as e:
+        LOGGER(__name__).warning(f"Source thumbnail upload failed: {e}")
+        return None
+
+
+def _document_attributes(metadata: dict, media_type: str, file_name: str):
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if media_type == "video":
+        attributes.append(
+            raw.types.DocumentAttributeVideo(
+                duration=metadata.get("duration") or 0,
+                w=metadata.get("width") or 640,
+                h=metadata.get("height") or 480,
+                supports_streaming=True
+            )
+        )
+    elif media_type == "audio":
+        attributes.append(
+            raw.types.DocumentAttributeAudio(
+                duration=metadata.get("duration") or 0,
+                performer=metadata.get("performer"),
+                title=metadata.get("title")
+            )
+        )
+    return attributes
+
+
+async def stream_upload(bot, user, chat_message, file_name: str, progress=None, progress_args=()):
+    # Uploads the source media through `bot` while `user` downloads it and
+    # returns the raw InputFile; nothing touches the disk.
+    return await _upload_parts(
+        bot,
+        _metered(user, user.stream_media(chat_message)),
+        get_source_media(chat_message).file_size,
+        file_name,
+        progress,
+        progress_args
+    )
+
+
+async def build_input_media(
+    bot,
+    user,
+    chat_message,
+    input_file,
+    media_type: str,
+    file_name: str,
+    metadata: dict = None,
+    thumb_path: str = None
+):
+    # Wraps an uploaded InputFile in the InputMedia Telegram expects for its
+    # kind. `metadata` defaults to what the source message carries; the
+    # source thumbnail wins over a locally generated `thumb_path`.
+    if media_type == "photo":
+        return raw.types.InputMediaUploadedPhoto(file=input_file)
+
+    media = get_source_media(chat_message)
+    thumb = None
+    if media_type in ("video", "audio"):
+        thumb = await _upload_source_thumb(bot, user, chat_message)
+        if thumb is None and thumb_path:
+            thumb = await bot.save_file(thumb_path)
+
+    return raw.types.InputMediaUploadedDocument(
+        mime_type=getattr(media, "mime_type", None) or DEFAULT_MIME_TYPES.get(media_type, DEFAULT_MIME_TYPES["document"]),
+        file=input_file,
+        thumb=thumb,
+        attributes=_document_attributes(
+            metadata if metadata is not None else get_media_metadata(chat_message), media_type, file_name
+        )
+    )
+
+
+async def pre_upload_media(bot, target_chat_id, input_media):
+    # Stores the upload on Telegram's side without posting it and returns an
+    # InputMedia that references the stored file, ready for an album.
+    r = await RATE_LIMITER.call(
+        bot, "upload", target_chat_id,
+        bot.invoke,
+        raw.functions.messages.UploadMedia(
+            peer=await bot.resolve_peer(target_chat_id),
+            media=input_media
+        )
+    )
+
+    if isinstance(r, raw.types.MessageMediaPhoto):
+        return raw.types.InputMediaPhoto(
+            id=raw.types.InputPhoto(
+                id=r.photo.id,
+                access_hash=r.photo.access_hash,
+                file_reference=r.photo.file_reference
+            )
+        )
+    return raw.types.InputMediaDocument(
+        id=raw.types.InputDocument(
+            id=r.document.id,
+            access_hash=r.document.access_hash,
+            file_reference=r.document.file_reference
+        )
+    )
+
+
+async def send_prepared_media(bot, target_chat_id, input_media, caption):
+    r = await RATE_LIMITER.call(
+        bot, "send", target_chat_id,
+        bot.invoke,
+        raw.functions.messages.SendMedia(
+            peer=await bot.resolve_peer(target_chat_id),
+            media=input_media,
+            random_id=bot.rnd_id(),
+            **await utils.parse_text_entities(bot, caption or "", None, None)
+        )
+    )
+
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            return await types.Message._parse(
+                bot,
+                update.message,
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats}
+            )
+
+
+async def send_prepared_album(bot, target_chat_id, items):
+    # `items` are (pre-uploaded InputMedia, caption) pairs; the album send
+    # itself moves no file bytes.
+    multi_media = []
+    for input_media, caption in items:
+        multi_media.append(
+            raw.types.InputSingleMedia(
+                media=input_media,
+                random_id=bot.rnd_id(),
+                **await utils.parse_text_entities(bot, caption or "", None, None)
+            )
+        )
+
+    await RATE_LIMITER.call(
+        bot, "send", target_chat_id,
+        bot.invoke,
+        raw.functions.messages.SendMultiMedia(
+            peer=await bot.resolve_peer(target_chat_id),
+            multi_media=multi_media
+        )
+    )
+
+
+async def send_streamed_media(
+    bot,
+    user,
+    chat_message,
+    target_chat_id,
+    caption,
+    media_type: str,
+    file_name: str,
+    progress=None,
+    progress_args=()
+):
+    # Download from the user client and upload through the bot at the same
+    # time, holding at most STREAM_BUFFER_CHUNKS MiB in memory.
+    LOGGER(__name__).info(
+        f"Streaming {file_name} ({get_source_media(chat_message).file_size} bytes) to {target_chat_id}"
+    )
+
+    input_file = await stream_upload(bot, user, chat_message, file_name, progress, progress_args)
+    input_media = await build_input_media(bot, user, chat_message, input_file, media_type, file_name)
+    return await send_prepared_media(bot, target_chat_id, input_media, caption)
@@ -1,343 +1,42 @@
 import os
 import asyncio
 import time
-import math
 from typing import Optional
-from asyncio.subprocess import PIPE
-from asyncio import create_subprocess_exec, create_subprocess_shell, wait_for
-
-from pyrogram.parser import Parser
-from pyrogram.utils import get_channel_id
-from pyrogram.types import (
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    InputMediaPhoto,
-    InputMediaVideo,
-    InputMediaDocument,
-    InputMediaAudio,
-    Voice,
-)
-from pyrogram.errors import MessageNotModified
 
 from helpers.files import (
-    fileSizeLimit,
+    DISK_ADMISSION,
+    FileTooLarge,
     cleanup_download,
+    get_download_path,
     get_readable_file_size,
-    get_readable_time
+    max_file_size
 )
 
-from helpers.msg import get_parsed_msg
+from helpers.msg import get_parsed_msg, get_file_name, get_media_metadata, get_source_media
+from helpers.downloader import download_media
+from helpers.mediatools import (
+    get_media_info,
+    get_video_thumbnail,
+    remove_thumbnail
+)
+from helpers.metrics import ACTIVE_TRANSFERS, STAGE_SECONDS, TRANSFER_BYTES
+from helpers.ratelimit import RATE_LIMITER, reply, delete
+from helpers.retry import RETRYABLE_ERRORS, PartialDelivery, classify
+from helpers.stream import (
+    build_input_media,
+    can_stream,
+    pre_upload_media,
+    send_prepared_album,
+    send_prepared_media,
+    stream_upload
+)
+from helpers.progress import (
+    progressArgs,
+    progress_for_pyrogram,
+    refresh_progress_message
+)
 from logger import LOGGER
 
-
-# Progress bar template
-PROGRESS_BAR = """
-Percentage: {percentage:.2f}% | {current}/{total}
-Speed: {speed}/s
-Elapsed Time: {elapsed_time}
-Estimated Time Left: {est_time}
-"""
-
-# Cache to limit progress updates
-PROGRESS_CACHE = {}
-PROGRESS_STATE = {}
-PROGRESS_REFRESH_COOLDOWN = {}
-
-
-def progress_keyboard():
-    return InlineKeyboardMarkup(
-        [[InlineKeyboardButton("🔄 Refresh", callback_data="refresh_progress")]]
-    )
-
-
-def build_progress_text(
-    current,
-    total,
-    action,
-    template,
-    finish,
-    unfinish,
-    speed_text,
-    elapsed_text,
-    etl_text
-):
-    percentage = (current * 100) / total
-
-    bar_len = 20
-    filled = int(percentage / 100 * bar_len)
-    bar = finish * filled + unfinish * (bar_len - filled)
-
-    current_size = get_readable_file_size(current)
-    total_size = get_readable_file_size(total)
-    text = template.format(
-        percentage=percentage,
-        current=current_size,
-        total=total_size,
-        speed=speed_text,
-        elapsed_time=elapsed_text,
-        est_time=etl_text
-    )
-
-    return f"**{action}**\n{bar}\n{text}"
-
-
-async def cmd_exec(cmd, shell=False):
-    if shell:
-        proc = await create_subprocess_shell(cmd, stdout=PIPE, stderr=PIPE)
-    else:
-        proc = await create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
-
-    stdout, stderr = await proc.communicate()
-
-    try:
-        stdout = stdout.decode().strip()
-    except Exception:
-        stdout = "Unable to decode the response!"
-
-    try:
-        stderr = stderr.decode().strip()
-    except Exception:
-        stderr = "Unable to decode the error!"
-
-    return stdout, stderr, proc.returncode
-
-
-async def get_media_info(path):
-    try:
-        result = await cmd_exec([
-            "ffprobe", "-hide_banner", "-loglevel", "error",
-            "-print_format", "json", "-show_format", "-show_streams", path,
-        ])
-    except Exception as e:
-        LOGGER(__name__).error(f"Get Media Info: {e}. File: {path}")
-        return 0, None, None, None, None
-
-    if result[0] and result[2] == 0:
-        try:
-            import json
-            data = json.loads(result[0])
-
-            fields = data.get("format", {})
-            duration = round(float(fields.get("duration", 0)))
-
-            tags = fields.get("tags", {})
-            artist = tags.get("artist") or tags.get("ARTIST") or tags.get("Artist")
-            title = tags.get("title") or tags.get("TITLE") or tags.get("Title")
-
-            width = None
-            height = None
-            for stream in data.get("streams", []):
-                if stream.get("codec_type") == "video":
-                    width = stream.get("width")
-                    height = stream.get("height")
-                    break
-
-            return duration, artist, title, width, height
-        except Exception as e:
-            LOGGER(__name__).error(f"Error parsing media info: {e}")
-            return 0, None, None, None, None
-
-    return 0, None, None, None, None
-
-
-async def get_video_thumbnail(video_file, duration):
-    os.makedirs("Assets", exist_ok=True)
-    output = os.path.join("Assets", "video_thumb.jpg")
-
-    if duration is None:
-        duration = (await get_media_info(video_file))[0]
-
-    if not duration:
-        duration = 3
-
-    duration //= 2
-
-    if os.path.exists(output):
-        try:
-            os.remove(output)
-        except Exception:
-            pass
-
-    cmd = [
-        "ffmpeg", "-hide_banner", "-loglevel", "error",
-        "-ss", str(duration), "-i", video_file,
-        "-vframes", "1", "-q:v", "2",
-        "-y", output,
-    ]
-
-    try:
-        _, err, code = await wait_for(cmd_exec(cmd), timeout=60)
-        if code != 0 or not os.path.exists(output):
-            LOGGER(__name__).warning(f"Thumbnail generation failed: {err}")
-            return None
-    except Exception as e:
-        LOGGER(__name__).warning(f"Thumbnail generation error: {e}")
-        return None
-
-    return output
-
-
-def progressArgs(action: str, progress_message, start_time):
-    return (action, progress_message, start_time, PROGRESS_BAR, "▓", "░")
-
-
-async def progress_for_pyrogram(
-    current,
-    total,
-    action,
-    message,
-    start_time,
-    template,
-    finish,
-    unfinish
-):
-    now = time.time()
-
-    is_download = "Download" in action
-    size_mb = total / (1024 * 1024)
-    if is_download:
-        interval = 25 if size_mb < 500 else 20
-    else:
-        interval = 5 if size_mb < 500 else 10
-
-    state = PROGRESS_STATE.get(message.id)
-    if not state:
-        state = {
-            "start_time": start_time,
-            "last_time": now,
-            "last_current": current,
-            "template": template,
-            "finish": finish,
-            "unfinish": unfinish,
-        }
-    PROGRESS_STATE[message.id] = {
-        "current": current,
-        "total": total,
-        "action": action,
-        "start_time": state["start_time"],
-        "last_time": state["last_time"],
-        "last_current": state["last_current"],
-        "template": template,
-        "finish": finish,
-        "unfinish": unfinish,
-    }
-
-    last_update = PROGRESS_CACHE.get(message.id, 0)
-    if current != total and (now - last_update) < interval:
-        return
-
-    PROGRESS_CACHE[message.id] = now
-
-    elapsed_time = now - PROGRESS_STATE[message.id]["start_time"]
-    if elapsed_time <= 0:
-        elapsed_time = 0.1
-
-    delta_time = now - PROGRESS_STATE[message.id]["last_time"]
-    if delta_time <= 0:
-        delta_time = 0.1
-    delta_bytes = current - PROGRESS_STATE[message.id]["last_current"]
-    if delta_bytes < 0:
-        delta_bytes = 0
-
-    speed_value = delta_bytes / delta_time if delta_bytes else (current / elapsed_time)
-    speed_text = f"{get_readable_file_size(speed_value)}/s"
-
-    remaining_bytes = total - current
-    if speed_value > 0:
-        etl_seconds = remaining_bytes / speed_value
-        etl_text = get_readable_time(int(etl_seconds))
-    else:
-        etl_text = "0s"
-    elapsed_text = get_readable_time(int(elapsed_time))
-
-    text = build_progress_text(
-        current=current,
-        total=total,
-        action=action,
-        template=template,
-        finish=finish,
-        unfinish=unfinish,
-        speed_text=speed_text,
-        elapsed_text=elapsed_text,
-        etl_text=etl_text
-    )
-
-    try:
-        await message.edit(text, reply_markup=progress_keyboard())
-    except MessageNotModified:
-        pass
-    except Exception as e:
-        LOGGER(__name__).error(f"Progress Error: {e}")
-
-    if current == total:
-        PROGRESS_CACHE.pop(message.id, None)
-        PROGRESS_STATE.pop(message.id, None)
-        PROGRESS_REFRESH_COOLDOWN.pop(message.id, None)
-    else:
-        PROGRESS_STATE[message.id]["last_time"] = now
-        PROGRESS_STATE[message.id]["last_current"] = current
-
-
-async def refresh_progress_message(message):
-    state = PROGRESS_STATE.get(message.id)
-    if not state:
-        return False, 0
-
-    now = time.time()
-    last_refresh = PROGRESS_REFRESH_COOLDOWN.get(message.id, 0)
-    if (now - last_refresh) < 4:
-        remaining = int(math.ceil(4 - (now - last_refresh)))
-        return False, remaining
-
-    PROGRESS_REFRESH_COOLDOWN[message.id] = now
-    PROGRESS_CACHE[message.id] = 0
-    state["last_time"] = now
-    state["last_current"] = state["current"]
-
-    elapsed_time = now - state["start_time"]
-    if elapsed_time <= 0:
-        elapsed_time = 0.1
-
-    delta_time = now - state.get("last_time", now)
-    if delta_time <= 0:
-        delta_time = 0.1
-    delta_bytes = state["current"] - state.get("last_current", state["current"])
-    if delta_bytes < 0:
-        delta_bytes = 0
-
-    speed_value = delta_bytes / delta_time if delta_bytes else (state["current"] / elapsed_time)
-    speed_text = f"{get_readable_file_size(speed_value)}/s"
-
-    remaining_bytes = state["total"] - state["current"]
-    if speed_value > 0:
-        etl_seconds = remaining_bytes / speed_value
-        etl_text = get_readable_time(int(etl_seconds))
-    else:
-        etl_text = "0s"
-    elapsed_text = get_readable_time(int(elapsed_time))
-
-    text = build_progress_text(
-        current=state["current"],
-        total=state["total"],
-        action=state["action"],
-        template=state["template"],
-        finish=state["finish"],
-        unfinish=state["unfinish"],
-        speed_text=speed_text,
-        elapsed_text=elapsed_text,
-        etl_text=etl_text
-    )
-    try:
-        await message.edit(text, reply_markup=progress_keyboard())
-    except MessageNotModified:
-        return True, 0
-    except Exception as e:
-        LOGGER(__name__).error(f"Progress Refresh Error: {e}")
-        return False, 0
-
-    return True, 0
-
-
 async def send_media(
     bot,
     message,
@@ -346,13 +45,20 @@ async def send_media(
     caption,
     progress_message,
     start_time,
-    destination_chat_id=None
+    destination_chat_id=None,
+    metadata=None
 ):
+    # `metadata` comes from helpers.msg.load_media_metadata; whatever the
+    # source message already carries is not probed again. Returns the sent
+    # Message; failures raise, so the caller can classify and retry them.
     file_size = os.path.getsize(media_path)
     target_chat_id = destination_chat_id or message.chat.id
+    metadata = metadata or {}
 
-    if not await fileSizeLimit(file_size, message, "upload"):
-        return
+    if file_size > max_file_size():
+        raise FileTooLarge(
+            f"The file size exceeds the {get_readable_file_size(max_file_size())} limit and cannot be uploaded."
+        )
 
     if progress_message:
         progress_args = progressArgs("📥 Uploading Progress", progress_message, start_time)
@@ -367,17 +73,29 @@ async def send_media(
         "progress_args": progress_args
     }
 
-    try:
-        if media_type == "photo":
-            await bot.send_photo(target_chat_id, media_path, **send_kwargs)
+    if media_type == "photo":
+        return await RATE_LIMITER.call(
+            bot, "send", target_chat_id,
+            bot.send_photo, target_chat_id, media_path, **send_kwargs
+        )
 
-        elif media_type == "video":
-            duration, _, _, width, height = await get_media_info(media_path)
-            width = width or 640
-            height = height or 480
-            thumb = await get_video_thumbnail(media_path, duration)
+    elif media_type == "video":
+        duration = metadata.get("duration")
+        width = metadata.get("width")
+        height = metadata.get("height")
+        if not (duration and width and height):
+            probed_duration, _, _, probed_width, probed_height = await get_media_info(media_path)
+            duration = duration or probed_duration
+            width = width or probed_width
+            height = height or probed_height
+        width = width or 640
+        height = height or 480
+        thumb = metadata.get("thumb") or await get_video_thumbnail(media_path, duration)
 
-            await bot.send_video(
+        try:
+            return await RATE_LIMITER.call(
+                bot, "send", target_chat_id,
+                bot.send_video,
                 target_chat_id,
                 media_path,
                 duration=duration,
@@ -387,113 +105,177 @@ async def send_media(
                 supports_streaming=True,
                 **send_kwargs
             )
-
-        elif media_type == "audio":
-            duration, artist, title, _, _ = await get_media_info(media_path)
-            await bot.send_audio(
-                target_chat_id,
-                media_path,
-                duration=duration,
-                performer=artist,
-                title=title,
-                **send_kwargs
-            )
-
-        elif media_type == "document":
-            await bot.send_document(target_chat_id, media_path, **send_kwargs)
-
-    except Exception as e:
-        LOGGER(__name__).error(f"Error sending media: {e}")
-
-
-async def download_single_media(msg, progress_message, start_time):
-    try:
-        media_path = await msg.download(
-            progress=progress_for_pyrogram,
-            progress_args=progressArgs(
-                "📥 Downloading Progress",
-                progress_message,
-                start_time
-            )
-        )
-
-        parsed_caption = await get_parsed_msg(
-            msg.caption or "",
-            msg.caption_entities
+        finally:
+            # Generated thumbnails are per-upload temp files
+            remove_thumbnail(thumb)
+
+    elif media_type == "audio":
+        duration = metadata.get("duration")
+        artist = metadata.get("performer")
+        title = metadata.get("title")
+        if not duration:
+            duration, probed_artist, probed_title, _, _ = await get_media_info(media_path)
+            artist = artist or probed_artist
+            title = title or probed_title
+        return await RATE_LIMITER.call(
+            bot, "send", target_chat_id,
+            bot.send_audio,
+            target_chat_id,
+            media_path,
+            duration=duration,
+            performer=artist,
+            title=title,
+            thumb=metadata.get("thumb"),
+            **send_kwargs
         )
 
-        if msg.photo:
-            return "success", media_path, InputMediaPhoto(media_path, parsed_caption)
-        if msg.video:
-            return "success", media_path, InputMediaVideo(media_path, parsed_caption)
-        if msg.document:
-            return "success", media_path, InputMediaDocument(media_path, parsed_caption)
-        if msg.audio:
-            return "success", media_path, InputMediaAudio(media_path, parsed_caption)
-
-    except Exception as e:
-        LOGGER(__name__).info(f"Error downloading media: {e}")
-        return "error", None, None
-
-    return "skip", None, None
-
+    return await RATE_LIMITER.call(
+        bot, "send", target_chat_id,
+        bot.send_document, target_chat_id, media_path, **send_kwargs
+    )
 
-async def processMediaGroup(chat_message, bot, message, destination_chat_id=None):
-    media_group_messages = await chat_message.get_media_group()
 
-    valid_media = []
-    temp_paths = []
-    invalid_paths = []
+def get_media_type(chat_message) -> Optional[str]:
+    if chat_message.photo:
+        return "photo"
+    if chat_message.video:
+        return "video"
+    if chat_message.audio:
+        return "audio"
+    if chat_message.document:
+        return "document"
+    return None
+
+
+async def prepare_group_member(bot, msg, target_chat_id, progress_message, start_time, folder, slot, partials=None):
+    # Gets one album member onto Telegram as soon as it is available:
+    # streamed straight through when possible, otherwise downloaded and
+    # uploaded right away, inside a transfer slot from `slot()`. Returns
+    # (pre-uploaded InputMedia, caption). A failed download's path is added
+    # to `partials`.
+    media_type = get_media_type(msg)
+    file_name = get_file_name(msg.id, msg)
+    caption = await get_parsed_msg(msg.caption or "", msg.caption_entities)
+    progress_args = progressArgs("📥 Downloading Progress", progress_message, start_time)
+    download_path = None
+    thumb_path = None
+    keep_partial = False
+
+    async with slot():
+        try:
+            metadata = get_media_metadata(msg)
+            if can_stream(msg, media_type):
+                with STAGE_SECONDS.time("stream"), ACTIVE_TRANSFERS.track("stream"):
+                    input_file = await stream_upload(
+                        bot, msg._client, msg, file_name, progress_for_pyrogram, progress_args
+                    )
+            else:
+                # Per request, and named after the source message: albums from
+                # other chats or requests never share a .temp file
+                download_path = get_download_path(folder, f"{msg.chat.id}_{msg.id}_{file_name}")
+                await DISK_ADMISSION.reserve(download_path, getattr(get_source_media(msg), "file_size", 0))
+                with STAGE_SECONDS.time("download"), ACTIVE_TRANSFERS.track("download"):
+                    await download_media(
+                        msg._client,
+                        msg,
+                        download_path,
+                        progress=progress_for_pyrogram,
+                        progress_args=progress_args
+                    )
+                if media_type == "video" and not (metadata.get("duration") and metadata.get("width") and metadata.get("height")):
+                    duration, _, _, width, height = await get_media_info(download_path)
+                    metadata["duration"] = metadata.get("duration") or duration
+                    metadata["width"] = metadata.get("width") or width
+                    metadata["height"] = metadata.get("height") or height
+                if media_type == "video" and not metadata.get("thumb_file_id"):
+                    thumb_path = await get_video_thumbnail(download_path, metadata.get("duration"))
+                with STAGE_SECONDS.time("upload"), ACTIVE_TRANSFERS.track("upload"):
+                    input_file = await bot.save_file(download_path)
+                TRANSFER_BYTES.inc(bot.name, "upload", amount=os.path.getsize(download_path))
+
+            input_media = await build_input_media(
+                bot, msg._client, msg, input_file, media_type, file_name, metadata, thumb_path
+            )
+            return await pre_upload_media(bot, target_chat_id, input_media), caption
+        except Exception:
+            keep_partial = True
+            raise
+        finally:
+            # The file is on Telegram's side now (or failed); free the disk
+            # early, keeping a failed download's partial file for a retry
+            if download_path:
+                cleanup_download(download_path, keep_partial=keep_partial)
+                if keep_partial and partials is not None:
+                    partials.add(download_path)
+            remove_thumbnail(thumb_path)
+
+
+async def processMediaGroup(chat_message, bot, message, slot, destination_chat_id=None, partials=None):
+    # Every member is pre-uploaded the moment it is ready, each in a transfer
+    # slot of its own from `slot()`, so the album send at the end only references
+    # files that are already on Telegram. Returns False when the group has
+    # no media; raises the last error when nothing could be delivered and
+    # PartialDelivery when only part of it was.
+    media_group_messages = await RATE_LIMITER.call(
+        chat_message._client, "fetch", chat_message.chat.id, chat_message.get_media_group
+    )
+    members = [msg for msg in media_group_messages if get_media_type(msg)]
 
     target_chat_id = destination_chat_id or message.chat.id
     start_time = time.time()
+    folder = f"{message.chat.id}_{message.id}"
 
-    progress_message = await message.reply(
+    progress_message = await reply(
+        message,
         f"📥 Downloading media group... ({len(media_group_messages)} files)"
     )
 
-    download_tasks = [
-        download_single_media(msg, progress_message, start_time)
-        for msg in media_group_messages
-        if msg.photo or msg.video or msg.document or msg.audio
-    ]
-
-    results = await asyncio.gather(*download_tasks, return_exceptions=True)
+    results = await asyncio.gather(
+        *(
+            prepare_group_member(bot, msg, target_chat_id, progress_message, start_time, folder, slot, partials)
+            for msg in members
+        ),
+        return_exceptions=True
+    )
 
-    for result in results:
+    prepared = []
+    failures = []
+    for msg, result in zip(members, results):
+        if isinstance(result, asyncio.CancelledError):
+            raise result
         if isinstance(result, Exception):
+            LOGGER(__name__).info(f"Error preparing media group item {msg.id}: {result}")
+            failures.append(result)
             continue
+        prepared.append(result)
 
-        status, media_path, media_obj = result
-        if status == "success":
-            temp_paths.append(media_path)
-            valid_media.append(media_obj)
-
-    if valid_media:
-        try:
-            await bot.send_media_group(target_chat_id, valid_media)
-            await progress_message.delete()
-        except Exception:
-            for media in valid_media:
-                try:
-                    if isinstance(media, InputMediaPhoto):
-                        await bot.send_photo(target_chat_id, media.media, media.caption)
-                    elif isinstance(media, InputMediaVideo):
-                        await bot.send_video(target_chat_id, media.media, caption=media.caption)
-                    elif isinstance(media, InputMediaDocument):
-                        await bot.send_document(target_chat_id, media.media, caption=media.caption)
-                    elif isinstance(media, InputMediaAudio):
-                        await bot.send_audio(target_chat_id, media.media, caption=media.caption)
-                except Exception:
-                    pass
-
-        for path in temp_paths + invalid_paths:
-            cleanup_download(path)
-
-        return True
+    await delete(progress_message)
+    if not members:
+        return False
+    # Nothing is sent yet: a transient failure retries the whole album
+    # without duplicating anything
+    transient = next((e for e in failures if classify(e) in RETRYABLE_ERRORS), None)
+    if transient or not prepared:
+        raise transient or failures[-1]
 
-    await progress_message.delete()
-    for path in invalid_paths:
-        cleanup_download(path)
-
-    return False
+    try:
+        await send_prepared_album(bot, target_chat_id, prepared)
+    except Exception as e:
+        # Already uploaded, so sending them one by one costs no transfer
+        LOGGER(__name__).warning(f"Album send failed, sending items one by one: {e}")
+        delivered = 0
+        for input_media, caption in prepared:
+            try:
+                await send_prepared_media(bot, target_chat_id, input_media, caption)
+                delivered += 1
+            except Exception as e_item:
+                LOGGER(__name__).error(f"Error sending media group item: {e_item}")
+                failures.append(e_item)
+        if not delivered:
+            raise failures[-1]
+
+    if failures:
+        raise PartialDelivery(
+            f"{len(members) - len(failures)} of {len(members)} album items sent, last error: {failures[-1]}"
+        )
+    return True
@@ -1,22 +1,113 @@
+import json
+import atexit
 import logging
-import os
-from logging.handlers import RotatingFileHandler
-
-# removing old logs file if they exist.
-try:
-    os.remove("logs.txt")
-except:
-    pass
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s - %(levelname)s] - %(funcName)s() - Line %(lineno)d: %(name)s - %(message)s",
-    datefmt="%d-%b-%y %I:%M:%S %p",
-    handlers=[
-        RotatingFileHandler("logs.txt", mode="w+", maxBytes=5000000, backupCount=10),
-        logging.StreamHandler(),
-    ],
-)
+from queue import SimpleQueue
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from config import PyroConf
+
+LOG_FILE = "logs.txt"
+
+# Job being worked on in the current task; asyncio tasks copy it, so every
+# line logged for a job's items carries the job ID
+JOB_ID = ContextVar("job_id", default=None)
+
+
+class JobFilter(logging.Filter):
+    def filter(self, record):
+        record.job_id = JOB_ID.get()
+        record.job = f"[job #{record.job_id}] " if record.job_id is not None else ""
+        return True
+
+
+def parse_sampling(spec: str) -> dict:
+    # "helpers.files:0.1,main:0.5" -> {"helpers.files": 10, "main": 2}:
+    # keep one in every N info/debug lines of that module (and its children)
+    every = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        module, rate = item.rsplit(":", 1)
+        rate = float(rate)
+        every[module.strip()] = round(1 / rate) if rate > 0 else 0
+    return every
+
+
+class SamplingFilter(logging.Filter):
+    # Thins out chatty modules; warnings and errors are always kept
+    def __init__(self, every: dict):
+        super().__init__()
+        self.every = every
+        self.counts = {}
+
+    def _rule(self, name):
+        while name:
+            if name in self.every:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rule = self._rule(record.name)
+        if rule is None:
+            return True
+        keep_every = self.every[rule]
+        if not keep_every:
+            return False
+        count = self.counts.get(rule, 0)
+        self.counts[rule] = count + 1
+        return count % keep_every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "job_id", None) is not None:
+            entry["job_id"] = record.job_id
+        return json.dumps(entry, ensure_ascii=False)
+
+
+if PyroConf.LOG_FORMAT == "json":
+    formatter = JsonFormatter()
+else:
+    formatter = logging.Formatter(
+        "[%(asctime)s - %(levelname)s] - %(funcName)s() - Line %(lineno)d: %(name)s - %(job)s%(message)s",
+        datefmt="%d-%b-%y %I:%M:%S %p",
+    )
+
+# Records are only put on a queue by the caller (the event loop); a
+# background thread formats them and does the file and console I/O.
+# The log file is appended to, so a restart keeps the previous run's lines.
+file_handler = RotatingFileHandler(LOG_FILE, mode="a", maxBytes=5000000, backupCount=10)
+stream_handler = logging.StreamHandler()
+for handler in (file_handler, stream_handler):
+    handler.setFormatter(formatter)
+
+log_queue = SimpleQueue()
+queue_handler = QueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(parse_sampling(PyroConf.LOG_SAMPLING)))
+queue_handler.addFilter(JobFilter())
+
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+root.addHandler(queue_handler)
+
+listener = QueueListener(log_queue, file_handler, stream_handler)
+listener.start()
+# Flushes whatever is still queued on exit
+atexit.register(listener.stop)
 
 logging.getLogger("pyrogram").setLevel(logging.ERROR)
 
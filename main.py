@@ -2,17 +2,15 @@
 
 import os
 import shutil
-import psutil
 import asyncio
 from time import time
-from aiohttp import web
 
 # Removed pyleaves import
 # from pyleaves import Leaves
 
 from pyrogram.enums import ParseMode
-from pyrogram import Client, filters
-from pyrogram.errors import PeerIdInvalid, BadRequest, FloodWait
+from pyrogram import Client, filters, idle
+from pyrogram.errors import FloodWait
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 
 from helpers.utils import (
@@ -24,21 +22,61 @@ from helpers.utils import (
 )
 
 from helpers.files import (
+    DISK_ADMISSION,
     get_download_path,
     fileSizeLimit,
     get_readable_file_size,
     get_readable_time,
-    cleanup_download
+    cleanup_download,
+    sweep_stale_partials
 )
 
 from helpers.msg import (
+    extract_links,
+    LinkLimitExceeded,
     getChatMsgID,
     get_file_name,
-    get_parsed_msg
+    get_parsed_msg,
+    get_source_media,
+    load_media_metadata
+)
+
+from helpers.batch import prefetch_messages
+from helpers.strategy import CLONE_STRATEGY_CACHE
+from helpers.sessions import SessionPool
+from helpers.scheduler import FairScheduler, parse_user_weights
+from helpers.destinations import DESTINATIONS
+from helpers.peers import PEER_CACHE
+from helpers.metrics import (
+    ACTIVE_TRANSFERS,
+    CLONE_PATH_TOTAL,
+    ITEM_RETRIES_TOTAL,
+    JOBS_TOTAL,
+    STAGE_SECONDS,
+    TRANSFER_BYTES,
+    render as render_metrics
+)
+from helpers.stream import can_stream, send_streamed_media
+from helpers.downloader import download_media as download_media_parts
+from helpers.filecache import FILE_ID_CACHE, send_cached_copy, remember_upload
+from helpers.ratelimit import RATE_LIMITER, reply, edit, delete
+from helpers.retry import ItemResult, RETRYABLE_ERRORS, ERROR_FILE_REFERENCE, ERROR_PERMISSION, backoff_delay, classify
+from helpers.startup import STARTUP
+from helpers.jobs import (
+    JOB_STORE,
+    Job,
+    JobItem,
+    JOB_DONE,
+    JOB_CANCELLED,
+    ITEM_CLONED,
+    ITEM_DOWNLOADED,
+    ITEM_UPLOADED,
+    ITEM_SKIPPED,
+    ITEM_FAILED
 )
 
 from config import PyroConf
-from logger import LOGGER
+from logger import LOGGER, LOG_FILE, JOB_ID
 
 # Initialize the bot client
 bot = Client(
@@ -48,26 +86,55 @@ bot = Client(
     bot_token=PyroConf.BOT_TOKEN,
     workers=100,
     parse_mode=ParseMode.MARKDOWN,
-    max_concurrent_transmissions=1,
-    sleep_threshold=30,
+    max_concurrent_transmissions=PyroConf.MAX_CONCURRENT_TRANSMISSIONS,
+    sleep_threshold=PyroConf.SLEEP_THRESHOLD,
 )
 
+# Upload-only bots: they never register handlers, so the primary bot stays
+# free for commands and progress messages
+UPLOAD_BOTS = [
+    Client(
+        f"upload_bot_{i}",
+        api_id=PyroConf.API_ID,
+        api_hash=PyroConf.API_HASH,
+        bot_token=token,
+        parse_mode=ParseMode.MARKDOWN,
+        max_concurrent_transmissions=PyroConf.MAX_CONCURRENT_TRANSMISSIONS,
+        sleep_threshold=PyroConf.SLEEP_THRESHOLD,
+        no_updates=True,
+    )
+    for i, token in enumerate(PyroConf.BOT_TOKENS, start=1)
+]
+UPLOAD_LANES = SessionPool(UPLOAD_BOTS or [bot])
+
 # Client for user session
 user = Client(
     "user_session",
     workers=100,
     session_string=PyroConf.SESSION_STRING,
-    max_concurrent_transmissions=1,
-    sleep_threshold=30,
+    max_concurrent_transmissions=PyroConf.MAX_CONCURRENT_TRANSMISSIONS,
+    sleep_threshold=PyroConf.SLEEP_THRESHOLD,
 )
 
+# Extra user sessions share the reading load; `user` stays the primary
+USER_POOL = SessionPool([user] + [
+    Client(
+        f"user_session_{i}",
+        workers=100,
+        session_string=session_string,
+        max_concurrent_transmissions=PyroConf.MAX_CONCURRENT_TRANSMISSIONS,
+        sleep_threshold=PyroConf.SLEEP_THRESHOLD,
+    )
+    for i, session_string in enumerate(PyroConf.SESSION_STRINGS, start=1)
+])
+
 RUNNING_TASKS = set()
-download_semaphore = None
+TRANSFER_SCHEDULER = None  # Shares the transfer slots fairly between users
+JOB_WAKEUP = None  # Set whenever a job is submitted, wakes idle job workers
+JOB_FAILURES = {}  # job ID -> runs that crashed, for the requeue backoff
+MAX_LINK_FILE_SIZE = 5 * 1024 * 1024  # Uploaded .txt link lists
 BATCH_STATES = {}  # Stores state for user interactions: {user_id: {'step': '...', 'data': ...}}
 
-# GLOBAL SETTING FOR DESTINATION CHANNEL
-DESTINATION_CHAT_ID = None
-
 def track_task(coro):
     task = asyncio.create_task(coro)
     RUNNING_TASKS.add(task)
@@ -95,7 +162,7 @@ async def start(_, message: Message):
     markup = InlineKeyboardMarkup(
         [[InlineKeyboardButton("Update Channel", url="https://t.me/itsSmartDev")]]
     )
-    await message.reply(welcome_text, reply_markup=markup, disable_web_page_preview=True)
+    await reply(message, welcome_text, reply_markup=markup, disable_web_page_preview=True)
 
 
 @bot.on_message(filters.command("help") & filters.private)
@@ -109,6 +176,9 @@ async def help_command(_, message: Message):
         "   2. Send the **Start Link**\n"
         "   3. Send the **Number of Messages** (e.g., 100)\n"
         "   The bot will calculate the range and process them.\n\n"
+        "➤ **Bulk Links**\n"
+        "   – Paste many links in one message, or ranges like `https://t.me/c/123/100-900`.\n"
+        "   – Or upload a `.txt` file with links; everything is queued as one job.\n\n"
         "➤ **Destination Settings**\n"
         "   – `/set -100xxxx`: Set a channel for uploads.\n"
         "   – `/set none`: Reset to default (upload to this chat).\n"
@@ -124,17 +194,17 @@ async def help_command(_, message: Message):
     markup = InlineKeyboardMarkup(
         [[InlineKeyboardButton("Update Channel", url="https://t.me/itsSmartDev")]]
     )
-    await message.reply(help_text, reply_markup=markup, disable_web_page_preview=True)
+    await reply(message, help_text, reply_markup=markup, disable_web_page_preview=True)
 
 # -------------------------------------------------------------------------------------
 # DESTINATION CHANNEL SETTING
 # -------------------------------------------------------------------------------------
 @bot.on_message(filters.command("set") & filters.private)
 async def set_destination(bot: Client, message: Message):
-    global DESTINATION_CHAT_ID
-    
+    # Each user has their own destination (see helpers.destinations)
     if len(message.command) < 2:
-        await message.reply(
+        await reply(
+            message,
             "❌ **Usage:** `/set <channel_id>`\n"
             "Example: `/set -100123456789`\n"
             "To reset: `/set none`"
@@ -144,8 +214,8 @@ async def set_destination(bot: Client, message: Message):
     input_arg = message.command[1]
 
     if input_arg.lower() == "none":
-        DESTINATION_CHAT_ID = None
-        await message.reply("✅ **Destination removed.** Files will be sent to this chat.")
+        DESTINATIONS.clear(message.from_user.id)
+        await reply(message, "✅ **Destination removed.** Files will be sent to this chat.")
         return
 
     try:
@@ -153,212 +223,435 @@ async def set_destination(bot: Client, message: Message):
         try:
             target_id = int(input_arg)
         except ValueError:
-            # Fallback: maybe a username?
-            chat_obj = await bot.get_chat(input_arg)
-            target_id = chat_obj.id
+            # Fallback: maybe a username? (cached after the first /set)
+            target_id = PEER_CACHE.peer_id_for(bot, input_arg)
+            if target_id is None:
+                chat_obj = await RATE_LIMITER.call(bot, "fetch", input_arg, bot.get_chat, input_arg)
+                target_id = chat_obj.id
+                await PEER_CACHE.capture(bot, target_id, input_arg.lstrip("@"))
 
         # Verify bot permissions by sending a test message
         try:
-            sent_msg = await bot.send_message(target_id, "✅ **Destination Channel Connected Successfully!**")
+            sent_msg = await RATE_LIMITER.call(
+                bot, "send", target_id,
+                bot.send_message, target_id, "✅ **Destination Channel Connected Successfully!**"
+            )
             # Optional: delete the test message after a few seconds
             # await asyncio.sleep(5)
             # await sent_msg.delete()
         except Exception as e:
-            await message.reply(
+            await reply(
+                message,
                 f"❌ **Failed to connect to channel `{target_id}`**.\n\n"
                 f"**Error:** `{e}`\n"
                 "👉 Make sure the Bot is an **Admin** in that channel with post permissions."
             )
             return
 
-        DESTINATION_CHAT_ID = target_id
-        await message.reply(f"✅ **Destination Channel Set!**\nAll downloads will now be uploaded to ID: `{target_id}`")
+        DESTINATIONS.set(message.from_user.id, target_id)
+        await reply(message, f"✅ **Destination Channel Set!**\nAll downloads will now be uploaded to ID: `{target_id}`")
         LOGGER(__name__).info(f"Destination channel set to {target_id} by user {message.from_user.id}")
 
     except Exception as e:
-        await message.reply(f"❌ **Error:** {str(e)}")
+        await reply(message, f"❌ **Error:** {str(e)}")
 
 
 # -------------------------------------------------------------------------------------
-# CORE DOWNLOAD LOGIC (With Cloning)
+# CLONE ATTEMPTS
 # -------------------------------------------------------------------------------------
-async def handle_download(bot: Client, message: Message, post_url: str, silent: bool = False):
-    async with download_semaphore:
-        if "?" in post_url:
-            post_url = post_url.split("?", 1)[0]
+# The user-side attempts run on the session that fetched `chat_message`
+# ATTEMPT A: User Client Direct
+async def clone_via_user(bot: Client, chat_message: Message, chat_id, message_id, target_chat_id):
+    client = chat_message._client
+    copy = client.copy_media_group if chat_message.media_group_id else client.copy_message
+    await RATE_LIMITER.call(
+        client, "copy", target_chat_id,
+        copy, chat_id=target_chat_id, from_chat_id=chat_id, message_id=message_id
+    )
 
-        # Determine target chat
-        target_chat_id = DESTINATION_CHAT_ID if DESTINATION_CHAT_ID else message.chat.id
 
+# ATTEMPT B: Bot Client Direct
+async def clone_via_bot(bot: Client, chat_message: Message, chat_id, message_id, target_chat_id):
+    copy = bot.copy_media_group if chat_message.media_group_id else bot.copy_message
+    await RATE_LIMITER.call(
+        bot, "copy", target_chat_id,
+        copy, chat_id=target_chat_id, from_chat_id=chat_id, message_id=message_id
+    )
+
+
+# ATTEMPT C: Relay (User -> Bot -> Destination)
+async def clone_via_relay(bot: Client, chat_message: Message, chat_id, message_id, target_chat_id):
+    if not bot.me:
+        await bot.get_me()
+
+    bot_username = bot.me.username
+    client = chat_message._client
+    LOGGER(__name__).info(f"Attempting Relay Clone via {bot_username}...")
+
+    if chat_message.media_group_id:
+        # 1. User copies to Bot
+        relayed_msgs = await RATE_LIMITER.call(
+            client, "copy", bot_username,
+            client.copy_media_group,
+            chat_id=bot_username,
+            from_chat_id=chat_id,
+            message_id=message_id
+        )
+        # 2. Bot copies to Destination
+        if relayed_msgs:
+            await RATE_LIMITER.call(
+                bot, "copy", target_chat_id,
+                bot.copy_media_group,
+                chat_id=target_chat_id,
+                from_chat_id=bot.me.id,
+                message_id=relayed_msgs[0].id
+            )
+    else:
+        # 1. User copies to Bot
+        relayed_msg = await RATE_LIMITER.call(
+            client, "copy", bot_username,
+            client.copy_message,
+            chat_id=bot_username,
+            from_chat_id=chat_id,
+            message_id=message_id
+        )
+        # 2. Bot copies to Destination
+        await RATE_LIMITER.call(
+            bot, "copy", target_chat_id,
+            bot.copy_message,
+            chat_id=target_chat_id,
+            from_chat_id=bot.me.id,
+            message_id=relayed_msg.id
+        )
+        # 3. Cleanup
         try:
-            chat_id, message_id = getChatMsgID(post_url)
-            chat_message = await user.get_messages(chat_id=chat_id, message_ids=message_id)
-            
-            LOGGER(__name__).info(f"Processing URL: {post_url}")
+            await delete(relayed_msg)
+        except:
+            pass
 
-            # --- 1. TRY DIRECT CLONE (Optimization) ---
-            # Strategies:
-            # A. User -> Destination (Fastest, requires User to be Admin in Dest)
-            # B. Bot -> Destination (Fastest, requires Bot to be in Source)
-            # C. User -> Bot -> Destination (Relay, requires Source to be Cloneable)
-            
-            cloned = False
-            
-            # ATTEMPT A: User Client Direct
+
+CLONE_ATTEMPTS = {
+    "user": clone_via_user,
+    "bot": clone_via_bot,
+    "relay": clone_via_relay,
+}
+
+
+# -------------------------------------------------------------------------------------
+# CORE DOWNLOAD LOGIC (With Cloning)
+# -------------------------------------------------------------------------------------
+def owner_of(message: Message):
+    # Whose share of the transfer slots an item counts against
+    return message.from_user.id if message.from_user else message.chat.id
+
+
+async def handle_download(
+    bot: Client,
+    message: Message,
+    post_url: str,
+    silent: bool = False,
+    chat_message: Message = None,
+    target_chat_id=None,
+    checkpoint=None,
+    final=True
+):
+    # Returns an ItemResult: the final item state (see helpers.jobs) and, for
+    # failures, the stage and error class. `checkpoint` is called with
+    # ITEM_DOWNLOADED once the file is on disk, before the upload. `final`
+    # False means a later retry pass may come back for a transient failure,
+    # so its partial download stays on disk.
+    owner_id = owner_of(message)
+    if "?" in post_url:
+        post_url = post_url.split("?", 1)[0]
+
+    # Determine target chat (jobs pin the destination they were submitted with)
+    if target_chat_id is None:
+        target_chat_id = DESTINATIONS.get(owner_id) or message.chat.id
+
+    result = ItemResult()
+    retries = max(0, PyroConf.ITEM_RETRIES)
+    for attempt in range(retries + 1):
+        result.reset()
+        result.attempts += 1
+        async with TRANSFER_SCHEDULER.slot(owner_id):
+            # Uploads to a destination channel go out on the least loaded upload
+            # lane; replies to the requester's own chat need the primary bot.
+            lane = UPLOAD_LANES.pick() if target_chat_id != message.chat.id else bot
+            with UPLOAD_LANES.lease(lane):
+                result.state = await process_post(
+                    lane, message, post_url, silent, chat_message, target_chat_id, checkpoint, result
+                )
+
+        if result.state != ITEM_FAILED or not result.retryable or attempt == retries:
+            break
+
+        # Transient failure: back off outside the transfer slot, so other
+        # items keep it busy meanwhile
+        if result.error_class == ERROR_FILE_REFERENCE:
+            # A fresh copy of the message carries a fresh file reference
+            chat_message = None
+        delay = backoff_delay(attempt, result.retry_after)
+        ITEM_RETRIES_TOTAL.inc(result.error_class)
+        LOGGER(__name__).warning(
+            f"Retrying {post_url} in {delay:.1f}s after {result.error_class} at {result.stage}"
+        )
+        await asyncio.sleep(delay)
+
+    if result.state == ITEM_FAILED:
+        for path in result.partials:
+            if final or not result.retryable:
+                # Nobody will resume it: free the disk now instead of at
+                # the next startup sweep
+                cleanup_download(path)
+            else:
+                # The retry pass re-reserves what is still missing
+                DISK_ADMISSION.release(path)
+
+    # A transient failure a later retry pass comes back for is not reported yet
+    if result.error_class and not silent and (final or not result.retryable):
+        if result.error_class == ERROR_PERMISSION:
+            await reply(message, f"**Error processing {post_url}: User client likely not in chat.**")
+        else:
+            await reply(message, f"**❌ Error at {post_url} ({result.stage}): {result.error}**")
+    return result
+
+
+async def process_post(
+    bot: Client,
+    message: Message,
+    post_url: str,
+    silent: bool,
+    chat_message: Message,
+    target_chat_id,
+    checkpoint,
+    result: ItemResult
+):
+    # `bot` is the upload lane; status messages still go through `message`.
+    # Exceptions are recorded on `result` with the stage that raised them.
+    progress_message = None
+    try:
+        result.stage = "fetch"
+        chat_id, message_id = getChatMsgID(post_url)
+        # Batches hand over the message already resolved by the prefetch
+        # stage, unless the session that fetched it has been benched since
+        if chat_message is None or USER_POOL.is_benched(chat_message._client):
+            with STAGE_SECONDS.time("fetch"):
+                chat_message = await USER_POOL.call(
+                    "fetch", chat_id, "get_messages", chat_id=chat_id, message_ids=message_id
+                )
+        client = chat_message._client
+
+        # Remember how both sides were reached so a restart starts warm
+        await PEER_CACHE.capture(client, chat_id)
+        await PEER_CACHE.capture(bot, target_chat_id)
+        
+        LOGGER(__name__).info(f"Processing URL: {post_url}")
+
+        # --- 1. TRY DIRECT CLONE (Optimization) ---
+        # Strategies:
+        # A. User -> Destination (Fastest, requires User to be Admin in Dest)
+        # B. Bot -> Destination (Fastest, requires Bot to be in Source)
+        # C. User -> Bot -> Destination (Relay, requires Source to be Cloneable)
+        # The strategy cache puts the path that last worked for this
+        # source/destination pair first, so known failures are skipped.
+        strategy_key = CLONE_STRATEGY_CACHE.key(
+            chat_id, target_chat_id, chat_message.media_group_id
+        )
+
+        cloned = False
+
+        result.stage = "clone"
+        for strategy in CLONE_STRATEGY_CACHE.plan(strategy_key):
+            if strategy == "download":
+                break
             try:
-                if chat_message.media_group_id:
-                    await user.copy_media_group(chat_id=target_chat_id, from_chat_id=chat_id, message_id=message_id)
-                else:
-                    await user.copy_message(chat_id=target_chat_id, from_chat_id=chat_id, message_id=message_id)
+                await CLONE_ATTEMPTS[strategy](
+                    bot, chat_message, chat_id, message_id, target_chat_id
+                )
                 cloned = True
-                LOGGER(__name__).info(f"Directly cloned via User: {post_url}")
-            except Exception as e_user:
-                LOGGER(__name__).info(f"User direct clone failed: {e_user}")
+                CLONE_STRATEGY_CACHE.record(strategy_key, strategy)
+                CLONE_PATH_TOTAL.inc(strategy)
+                LOGGER(__name__).info(f"Cloned via {strategy}: {post_url}")
+                break
+            except FloodWait:
+                # Rate limited even after retries: not a verdict on this path
+                raise
+            except Exception as e_clone:
+                CLONE_STRATEGY_CACHE.record_failure(strategy_key, strategy)
+                LOGGER(__name__).info(f"{strategy.capitalize()} clone failed: {e_clone}")
+
+        # If any clone attempt worked, exit early
+        # (pacing between clones is left to the rate limiter)
+        if cloned:
+            return ITEM_CLONED
+
+        CLONE_STRATEGY_CACHE.record(strategy_key, "download")
+        CLONE_PATH_TOTAL.inc("download")
+        # ------------------------------------------
+
+        # --- 2. FALLBACK: DOWNLOAD & UPLOAD ---
+        # LOGGER(__name__).info("All clone methods failed. Falling back to Download & Upload.")
+        
+        if chat_message.document or chat_message.video or chat_message.audio:
+            file_size = (
+                chat_message.document.file_size
+                if chat_message.document
+                else chat_message.video.file_size
+                if chat_message.video
+                else chat_message.audio.file_size
+            )
 
-                # ATTEMPT B: Bot Client Direct
-                try:
-                    if chat_message.media_group_id:
-                        await bot.copy_media_group(chat_id=target_chat_id, from_chat_id=chat_id, message_id=message_id)
-                    else:
-                        await bot.copy_message(chat_id=target_chat_id, from_chat_id=chat_id, message_id=message_id)
-                    cloned = True
-                    LOGGER(__name__).info(f"Directly cloned via Bot: {post_url}")
-                except Exception as e_bot:
-                    LOGGER(__name__).info(f"Bot direct clone failed: {e_bot}")
-
-                    # ATTEMPT C: Relay (User -> Bot -> Destination)
-                    try:
-                        if not bot.me:
-                            await bot.get_me()
-                        
-                        bot_username = bot.me.username
-                        LOGGER(__name__).info(f"Attempting Relay Clone via {bot_username}...")
-
-                        if chat_message.media_group_id:
-                            # 1. User copies to Bot
-                            relayed_msgs = await user.copy_media_group(
-                                chat_id=bot_username,
-                                from_chat_id=chat_id,
-                                message_id=message_id
-                            )
-                            # 2. Bot copies to Destination
-                            if relayed_msgs:
-                                await bot.copy_media_group(
-                                    chat_id=target_chat_id,
-                                    from_chat_id=bot.me.id,
-                                    message_id=relayed_msgs[0].id
-                                )
-                        else:
-                            # 1. User copies to Bot
-                            relayed_msg = await user.copy_message(
-                                chat_id=bot_username,
-                                from_chat_id=chat_id,
-                                message_id=message_id
-                            )
-                            # 2. Bot copies to Destination
-                            await bot.copy_message(
-                                chat_id=target_chat_id,
-                                from_chat_id=bot.me.id,
-                                message_id=relayed_msg.id
-                            )
-                            # 3. Cleanup
-                            try:
-                                await relayed_msg.delete()
-                            except:
-                                pass
-
-                        cloned = True
-                        LOGGER(__name__).info(f"Relay clone success: {post_url}")
-
-                    except Exception as e_relay:
-                        LOGGER(__name__).info(f"Relay clone failed: {e_relay}")
-
-            # If any clone attempt worked, exit early
-            if cloned:
-                await asyncio.sleep(PyroConf.FLOOD_WAIT_DELAY)
-                return 
-            # ------------------------------------------
-
-            # --- 2. FALLBACK: DOWNLOAD & UPLOAD ---
-            # LOGGER(__name__).info("All clone methods failed. Falling back to Download & Upload.")
-            
-            if chat_message.document or chat_message.video or chat_message.audio:
-                file_size = (
-                    chat_message.document.file_size
-                    if chat_message.document
-                    else chat_message.video.file_size
-                    if chat_message.video
-                    else chat_message.audio.file_size
-                )
+            if not await fileSizeLimit(
+                file_size, message, "download", client.me.is_premium
+            ):
+                return ITEM_FAILED
 
-                if not await fileSizeLimit(
-                    file_size, message, "download", user.me.is_premium
-                ):
-                    return
+        parsed_caption = await get_parsed_msg(
+            chat_message.caption or "", chat_message.caption_entities
+        )
+        parsed_text = await get_parsed_msg(
+            chat_message.text or "", chat_message.entities
+        )
 
-            parsed_caption = await get_parsed_msg(
-                chat_message.caption or "", chat_message.caption_entities
+        if chat_message.media_group_id:
+            result.stage = "album"
+            # Each member queues for a transfer slot of its own, fairly with
+            # everyone else's items; this item's slot is handed back meanwhile
+            owner_id = owner_of(message)
+            async with TRANSFER_SCHEDULER.released(owner_id):
+                delivered = await processMediaGroup(
+                    chat_message, bot, message, lambda: TRANSFER_SCHEDULER.slot(owner_id),
+                    destination_chat_id=target_chat_id, partials=result.partials
+                )
+            if not delivered:
+                if not silent:
+                    await reply(
+                        message,
+                        "**Could not extract any valid media from the media group.**"
+                    )
+                return ITEM_FAILED
+            return ITEM_UPLOADED
+
+        elif chat_message.media:
+            start_time = time()
+            
+            # --- NEW LOGIC: Generic Start Message + ID in Progress Header ---
+            if not silent:
+                # We send a generic message to initialize the progress bar container
+                progress_message = await reply(message, "**⏳ Initializing...**")
+                progress_func = progress_for_pyrogram
+                # Inject the ID into the Action Header string
+                progress_action_str = f"📥 Downloading (ID: {message_id})"
+                prog_args = progressArgs(progress_action_str, progress_message, start_time)
+            else:
+                progress_message = None
+                progress_func = None
+                prog_args = None
+
+            filename = get_file_name(message_id, chat_message)
+
+            media_type = (
+                "photo"
+                if chat_message.photo
+                else "video"
+                if chat_message.video
+                else "audio"
+                if chat_message.audio
+                else "document"
             )
-            parsed_text = await get_parsed_msg(
-                chat_message.text or "", chat_message.entities
+
+            # Media the bot uploaded before is re-sent by file_id, no transfer
+            if await send_cached_copy(bot, chat_message, target_chat_id, parsed_caption):
+                if progress_message:
+                    await delete(progress_message)
+                return ITEM_UPLOADED
+
+            # Stream straight from the user client into the upload when
+            # nothing needs a seekable file on disk.
+            if can_stream(chat_message, media_type):
+                if not await fileSizeLimit(get_source_media(chat_message).file_size, message, "upload"):
+                    if progress_message:
+                        await delete(progress_message)
+                    return ITEM_FAILED
+                result.stage = "stream"
+                try:
+                    stream_args = (
+                        progressArgs(f"📥 Streaming (ID: {message_id})", progress_message, start_time)
+                        if progress_message else ()
+                    )
+                    with STAGE_SECONDS.time("stream"), ACTIVE_TRANSFERS.track("stream"), USER_POOL.lease(client):
+                        sent = await send_streamed_media(
+                            bot,
+                            client,
+                            chat_message,
+                            target_chat_id,
+                            parsed_caption,
+                            media_type,
+                            filename,
+                            progress=progress_func,
+                            progress_args=stream_args
+                        )
+                    remember_upload(bot, chat_message, sent)
+                    if progress_message:
+                        await delete(progress_message)
+                    return ITEM_UPLOADED
+                except Exception as e:
+                    LOGGER(__name__).warning(
+                        f"Streaming failed for {post_url}, falling back to disk: {e}"
+                    )
+
+            result.stage = "download"
+            # Named after the source post: two posts of one job with the same
+            # file name must never share a .temp file, sidecar or resume
+            download_path = get_download_path(
+                message.id, f"{chat_message.chat.id}_{chat_message.id}_{filename}"
             )
+            result.partials.add(download_path)
+            expected_size = getattr(get_source_media(chat_message), "file_size", 0)
 
-            if chat_message.media_group_id:
-                if not await processMediaGroup(chat_message, bot, message, destination_chat_id=target_chat_id):
-                    if not silent:
-                        await message.reply(
-                            "**Could not extract any valid media from the media group.**"
+            if expected_size and os.path.exists(download_path) and os.path.getsize(download_path) == expected_size:
+                # Resumed job: the file survived from the "downloaded" checkpoint
+                media_path = download_path
+            else:
+                # Waits (instead of failing) until the disk can hold the file
+                await DISK_ADMISSION.reserve(download_path, expected_size)
+                try:
+                    with STAGE_SECONDS.time("download"), ACTIVE_TRANSFERS.track("download"), USER_POOL.lease(client):
+                        media_path = await download_media_parts(
+                            client,
+                            chat_message,
+                            download_path,
+                            progress=progress_func, # Use the variable
+                            progress_args=prog_args or (), # Use the variable
                         )
-                return
+                except Exception:
+                    # Frees the reservation; the partial file stays for a resume
+                    cleanup_download(download_path, keep_partial=True)
+                    raise
+                except BaseException:
+                    # Cancelled: nobody will come back for the partial file
+                    cleanup_download(download_path)
+                    raise
+
+            if not media_path or not os.path.exists(media_path):
+                if progress_message: await edit(progress_message, "**❌ Download failed: File not saved properly**")
+                cleanup_download(download_path)
+                return ITEM_FAILED
+
+            file_size = os.path.getsize(media_path)
+            if file_size == 0:
+                if progress_message: await edit(progress_message, "**❌ Download failed: File is empty**")
+                cleanup_download(media_path)
+                return ITEM_FAILED
 
-            elif chat_message.media:
-                start_time = time()
-                
-                # --- NEW LOGIC: Generic Start Message + ID in Progress Header ---
-                if not silent:
-                    # We send a generic message to initialize the progress bar container
-                    progress_message = await message.reply("**⏳ Initializing...**")
-                    progress_func = progress_for_pyrogram
-                    # Inject the ID into the Action Header string
-                    progress_action_str = f"📥 Downloading (ID: {message_id})"
-                    prog_args = progressArgs(progress_action_str, progress_message, start_time)
-                else:
-                    progress_message = None
-                    progress_func = None
-                    prog_args = None
-
-                filename = get_file_name(message_id, chat_message)
-                download_path = get_download_path(message.id, filename)
-
-                media_path = await chat_message.download(
-                    file_name=download_path,
-                    progress=progress_func, # Use the variable
-                    progress_args=prog_args, # Use the variable
-                )
+            LOGGER(__name__).info(f"Downloaded media: {media_path} (Size: {file_size} bytes)")
+            if checkpoint:
+                checkpoint(ITEM_DOWNLOADED)
 
-                if not media_path or not os.path.exists(media_path):
-                    if progress_message: await progress_message.edit("**❌ Download failed: File not saved properly**")
-                    return
-
-                file_size = os.path.getsize(media_path)
-                if file_size == 0:
-                    if progress_message: await progress_message.edit("**❌ Download failed: File is empty**")
-                    cleanup_download(media_path)
-                    return
-
-                LOGGER(__name__).info(f"Downloaded media: {media_path} (Size: {file_size} bytes)")
-
-                media_type = (
-                    "photo"
-                    if chat_message.photo
-                    else "video"
-                    if chat_message.video
-                    else "audio"
-                    if chat_message.audio
-                    else "document"
-                )
-                
-                await send_media(
+            result.stage = "upload"
+            metadata = await load_media_metadata(client, chat_message)
+            with STAGE_SECONDS.time("upload"), ACTIVE_TRANSFERS.track("upload"):
+                sent = await send_media(
                     bot,
                     message,
                     media_path,
@@ -366,43 +659,204 @@ async def handle_download(bot: Client, message: Message, post_url: str, silent:
                     parsed_caption,
                     progress_message, # Pass None if silent
                     start_time,
-                    destination_chat_id=target_chat_id
+                    destination_chat_id=target_chat_id,
+                    metadata=metadata
                 )
+            TRANSFER_BYTES.inc(bot.name, "upload", amount=file_size)
+            remember_upload(bot, chat_message, sent)
 
-                cleanup_download(media_path)
-                
-                # Only delete if we actually sent a status message
-                if progress_message:
-                    await progress_message.delete()
-
-            elif chat_message.text or chat_message.caption:
-                # Send text to target chat
-                if target_chat_id != message.chat.id:
-                    await bot.send_message(target_chat_id, parsed_text or parsed_caption)
-                else:
-                    await message.reply(parsed_text or parsed_caption)
+            cleanup_download(media_path)
+            
+            # Only delete if we actually sent a status message
+            if progress_message:
+                await delete(progress_message)
+            return ITEM_UPLOADED
+
+        elif chat_message.text or chat_message.caption:
+            # Send text to target chat
+            result.stage = "send"
+            if target_chat_id != message.chat.id:
+                await RATE_LIMITER.call(
+                    bot, "send", target_chat_id,
+                    bot.send_message, target_chat_id, parsed_text or parsed_caption
+                )
             else:
-                if not silent:
-                    await message.reply("**No media or text found in the post URL.**")
-
-        except (PeerIdInvalid, BadRequest, KeyError):
-            if not silent:
-                await message.reply(f"**Error processing {post_url}: User client likely not in chat.**")
-        except Exception as e:
-            error_message = f"**❌ Error at {post_url}: {str(e)}**"
+                await RATE_LIMITER.call(
+                    bot, "send", target_chat_id,
+                    message.reply, parsed_text or parsed_caption
+                )
+            return ITEM_UPLOADED
+        else:
             if not silent:
-                await message.reply(error_message)
-            LOGGER(__name__).error(e)
+                await reply(message, "**No media or text found in the post URL.**")
+            return ITEM_SKIPPED
+
+    except Exception as e:
+        # Retried or reported by handle_download
+        result.fail(e)
+        LOGGER(__name__).error(f"{post_url} failed at {result.stage} ({result.error_class}): {e}")
+        # A retry posts a status message of its own
+        if progress_message:
+            try:
+                await delete(progress_message)
+            except Exception as e_delete:
+                LOGGER(__name__).warning(f"Could not delete status message: {e_delete}")
+    return ITEM_FAILED
 
 
 @bot.on_message(filters.command("dl") & filters.private)
 async def download_media(bot: Client, message: Message):
     if len(message.command) < 2:
-        await message.reply("**Provide a post URL after the /dl command.**")
+        await reply(message, "**Provide a post URL after the /dl command.**")
         return
     post_url = message.command[1]
-    # Single download is NOT silent, so we see progress bars
-    await track_task(handle_download(bot, message, post_url, silent=False))
+    await submit_single_link(message, post_url)
+
+
+# -------------------------------------------------------------------------------------
+# JOB QUEUE
+# -------------------------------------------------------------------------------------
+# Handlers only record the work in JOB_STORE and acknowledge it; JOB_WORKERS
+# background workers drain the queue, and unfinished items resume after a restart.
+def submit_job(kind: str, message: Message, items) -> int:
+    target_chat_id = DESTINATIONS.get(message.from_user.id) or message.chat.id
+    job_id = JOB_STORE.submit(
+        kind, message.from_user.id, message.chat.id, message.id, target_chat_id, items
+    )
+    JOB_WAKEUP.set()
+    return job_id
+
+
+async def submit_single_link(message: Message, post_url: str):
+    post_url = post_url.split("?", 1)[0]
+    try:
+        chat_id, message_id = getChatMsgID(post_url)
+    except Exception as e:
+        await reply(message, f"**❌ {e}**")
+        return
+
+    job_id = submit_job("single", message, [(chat_id, message_id, post_url)])
+    await reply(message, f"📥 **Queued** as job `#{job_id}`.")
+
+
+async def run_job(job: Job):
+    # Tags every log line of this job (and its item tasks) with the job ID
+    JOB_ID.set(job.id)
+
+    # The request message is fetched again so resumed jobs can reply in place
+    message = await RATE_LIMITER.call(bot, "fetch", job.chat_id, bot.get_messages, job.chat_id, job.message_id)
+    if not message or message.empty:
+        LOGGER(__name__).warning(f"Job #{job.id}: request message {job.message_id} is gone, dropping job")
+        return
+
+    items = JOB_STORE.unfinished_items(job.id)
+
+    if job.kind == "batch":
+        await execute_batch_logic(bot, message, job, items)
+        return
+
+    # Single links are NOT silent, so we see progress bars
+    for item in items:
+        result = await handle_download(
+            bot,
+            message,
+            item.url,
+            silent=False,
+            target_chat_id=job.target_chat_id,
+            checkpoint=item_checkpoint(job, item)
+        )
+        JOB_STORE.record_result(job.id, item.seq, result)
+
+
+def item_checkpoint(job: Job, item: JobItem):
+    def _checkpoint(state: str):
+        JOB_STORE.set_item_state(job.id, item.seq, state)
+    return _checkpoint
+
+
+async def job_worker():
+    while True:
+        job = JOB_STORE.claim_next()
+        if job is None:
+            JOB_WAKEUP.clear()
+            await JOB_WAKEUP.wait()
+            continue
+
+        task = track_task(run_job(job))
+        try:
+            await task
+            if not JOB_STORE.is_cancelled(job.id):
+                JOB_STORE.finish_job(job.id, JOB_DONE)
+                JOBS_TOTAL.inc("done")
+            else:
+                JOBS_TOTAL.inc("cancelled")
+        except asyncio.CancelledError:
+            # Shutting down: leave the job "running" so it resumes on start
+            if asyncio.current_task().cancelling():
+                raise
+            # /killall cancelled just this job
+            JOB_STORE.finish_job(job.id, JOB_CANCELLED)
+            JOBS_TOTAL.inc("cancelled")
+        except Exception as e:
+            await job_failed(job, e)
+        else:
+            JOB_FAILURES.pop(job.id, None)
+        finally:
+            # The user's next job may be claimable now (USER_MAX_JOBS)
+            JOB_WAKEUP.set()
+
+
+def requeue_job(job_id: int):
+    if JOB_STORE.requeue_job(job_id):
+        JOB_WAKEUP.set()
+
+
+async def job_failed(job: Job, error: Exception):
+    # A crash outside the per-item handling (e.g. the request message could
+    # not be fetched). Transient errors put the job back in the queue after a
+    # backoff; it resumes from its unfinished items. Otherwise, or once
+    # JOB_RETRIES is used up, those items are marked failed and the user told.
+    error_class = classify(error)
+    failures = JOB_FAILURES[job.id] = JOB_FAILURES.get(job.id, 0) + 1
+    if error_class in RETRYABLE_ERRORS and failures <= PyroConf.JOB_RETRIES:
+        delay = backoff_delay(failures - 1, error.value if isinstance(error, FloodWait) else 0)
+        LOGGER(__name__).warning(f"Job #{job.id} failed ({error_class}): {error}; requeued in {delay:.1f}s")
+        asyncio.get_running_loop().call_later(delay, requeue_job, job.id)
+        return
+
+    JOB_FAILURES.pop(job.id, None)
+    LOGGER(__name__).error(f"Job #{job.id} failed: {error}")
+    failed = JOB_STORE.fail_unfinished(job.id, f"Job aborted: {error}", error_class)
+    JOB_STORE.finish_job(job.id, JOB_DONE)
+    JOBS_TOTAL.inc("failed")
+    try:
+        await RATE_LIMITER.call(
+            bot, "send", job.chat_id, bot.send_message, job.chat_id,
+            f"**❌ Job #{job.id} aborted:** {error}\n{failed} unfinished post(s) marked failed.",
+            reply_to_message_id=job.message_id
+        )
+    except Exception as e:
+        LOGGER(__name__).error(f"Could not tell user about aborted job #{job.id}: {e}")
+
+
+async def start_client(client: Client):
+    # Cached access hashes go back into the client before its first job;
+    # user sessions then refresh the cache from their dialogs.
+    await client.start()
+    try:
+        count = await PEER_CACHE.warm(client)
+        LOGGER(__name__).info(f"Restored {count} cached peers for {client.name}")
+    except Exception as e:
+        LOGGER(__name__).warning(f"Peer warm-up failed for {client.name}: {e}")
+    if client in USER_POOL.clients:
+        asyncio.create_task(PEER_CACHE.warm_from_dialogs(client))
+
+
+async def start_job_workers():
+    JOB_STORE.requeue_interrupted()
+    for _ in range(max(1, PyroConf.JOB_WORKERS)):
+        asyncio.create_task(job_worker())
+    JOB_WAKEUP.set()
 
 
 # -------------------------------------------------------------------------------------
@@ -412,7 +866,8 @@ async def download_media(bot: Client, message: Message):
 async def batch_command_start(bot: Client, message: Message):
     # Set initial state
     BATCH_STATES[message.from_user.id] = {'step': 'ask_link'}
-    await message.reply(
+    await reply(
+        message,
         "🚀 **Batch Mode Initiated**\n\n"
         "Please send the **Start Link** of the first post you want to download."
     )
@@ -429,13 +884,14 @@ async def handle_text_and_states(bot: Client, message: Message):
         # --- Step 1: User sent the Link ---
         if state['step'] == 'ask_link':
             if not message.text.startswith("https://t.me/"):
-                await message.reply("❌ Invalid link. Please send a valid Telegram post link (e.g., https://t.me/channel/100).")
+                await reply(message, "❌ Invalid link. Please send a valid Telegram post link (e.g., https://t.me/channel/100).")
                 return
             
             # Store link and move to next step
             BATCH_STATES[user_id]['start_link'] = message.text
             BATCH_STATES[user_id]['step'] = 'ask_count'
-            await message.reply(
+            await reply(
+                message,
                 "✅ Link accepted.\n\n"
                 "**How many messages** do you want to process starting from there?\n"
                 "(Send a number, e.g., `100`)"
@@ -445,7 +901,7 @@ async def handle_text_and_states(bot: Client, message: Message):
         # --- Step 2: User sent the Count ---
         elif state['step'] == 'ask_count':
             if not message.text.isdigit():
-                await message.reply("❌ Please send a valid number.")
+                await reply(message, "❌ Please send a valid number.")
                 return
             
             count = int(message.text)
@@ -454,145 +910,313 @@ async def handle_text_and_states(bot: Client, message: Message):
             # Clean up state
             del BATCH_STATES[user_id]
             
-            # Execute Batch
-            await execute_batch_logic(bot, message, start_link, count)
+            # Queue the Batch
+            await submit_batch(message, start_link, count)
             return
 
-    # 2. If not in state, treat as a single download link (if it looks like a link)
+    # 2. A .txt file of links is queued as one bulk job
+    if message.document and (message.document.file_name or "").lower().endswith(".txt"):
+        await submit_bulk_file(message)
+        return
+
+    # 3. If not in state, treat as download link(s) (if it looks like a link)
     if message.text and not message.text.startswith("/"):
-        await track_task(handle_download(bot, message, message.text, silent=False))
+        try:
+            links = extract_links(message.text)
+        except LinkLimitExceeded as e:
+            await reply(message, f"**❌ {e}**")
+            return
+        if len(links) > 1:
+            await submit_bulk(message, links)
+        else:
+            await submit_single_link(message, links[0][2] if links else message.text)
+
+
+async def submit_bulk(message: Message, links):
+    # `links` come from extract_links(): deduplicated and grouped per source
+    # chat, so the batch prefetch stage resolves each chat in bulk.
+    job_id = submit_job("batch", message, links)
+    chats = len({chat_id for chat_id, _, _ in links})
+    await reply(
+        message,
+        f"📥 **Bulk Job Queued** as job `#{job_id}`\n"
+        f"Posts: `{len(links)}` from `{chats}` chat(s)"
+    )
 
 
-# Helper to run the batch loop
-async def execute_batch_logic(bot: Client, message: Message, start_link: str, count: int):
+async def submit_bulk_file(message: Message):
+    if message.document.file_size and message.document.file_size > MAX_LINK_FILE_SIZE:
+        await reply(
+            message,
+            f"**❌ Link files are limited to {get_readable_file_size(MAX_LINK_FILE_SIZE)}.**"
+        )
+        return
+
+    data = await message.download(in_memory=True)
+    try:
+        links = extract_links(bytes(data.getbuffer()).decode("utf-8", errors="ignore"))
+    except LinkLimitExceeded as e:
+        await reply(message, f"**❌ {e}**")
+        return
+    if not links:
+        await reply(message, "**❌ No Telegram post links found in that file.**")
+        return
+    await submit_bulk(message, links)
+
+
+async def submit_batch(message: Message, start_link: str, count: int):
+    if count > PyroConf.MAX_BULK_LINKS:
+        return await reply(message, f"**❌ One batch can hold at most {PyroConf.MAX_BULK_LINKS} posts.**")
+
     try:
         start_chat, start_id = getChatMsgID(start_link)
     except Exception as e:
-        return await message.reply(f"**❌ Error parsing start link:\n{e}**")
+        return await reply(message, f"**❌ Error parsing start link:\n{e}**")
 
     # Calculate End ID
     end_id = start_id + count - 1
-    
-    prefix = start_link.rsplit("/", 1)[0]
-    
-    loading = await message.reply(
-        f"📥 **Starting Batch Process**\n"
+
+    prefix = start_link.split("?", 1)[0].rsplit("/", 1)[0]
+    items = (
+        (start_chat, msg_id, f"{prefix}/{msg_id}")
+        for msg_id in range(start_id, end_id + 1)
+    )
+    job_id = submit_job("batch", message, items)
+    await reply(
+        message,
+        f"📥 **Batch Queued** as job `#{job_id}`\n"
         f"From: `{start_id}`\n"
         f"To: `{end_id}`\n"
         f"Total: `{count}` posts"
     )
 
-    downloaded = skipped = failed = 0
-    skipped_streak = 0
-    batch_tasks = []
-    BATCH_SIZE = PyroConf.BATCH_SIZE
 
-    for msg_id in range(start_id, end_id + 1):
-        url = f"{prefix}/{msg_id}"
+# Helper to run the batch loop
+async def execute_batch_logic(bot: Client, message: Message, job: Job, items):
+    loading = await reply(
+        message,
+        f"📥 **Starting Batch Process** (job `#{job.id}`)\n"
+        f"From: `{items[0].message_id if items else '-'}`\n"
+        f"To: `{items[-1].message_id if items else '-'}`\n"
+        f"Remaining: `{len(items)}` posts"
+    )
+
+    # Sliding window: up to BATCH_SIZE items in flight, and a slot is refilled
+    # as soon as any of them finishes instead of waiting for the slowest one.
+    in_flight = {}
+    window = max(1, PyroConf.BATCH_SIZE)
+
+    def record_failure(item, stage, error):
+        failed = ItemResult()
+        failed.stage = stage
+        failed.attempts = 1
+        failed.fail(error)
+        JOB_STORE.record_result(job.id, item.seq, failed)
+        LOGGER(__name__).error(f"Error at {item.url}: {error}")
+
+    def record_result(task):
+        item = in_flight.pop(task)
+        if task.cancelled():
+            return False
+        error = task.exception()
+        if error is not None:
+            record_failure(item, None, error)
+        else:
+            JOB_STORE.record_result(job.id, item.seq, task.result())
+        return True
+
+    # Waits until fewer than `limit` items are in flight. Returns False when
+    # the batch was cancelled.
+    async def drain(limit):
         try:
-            # Check if message exists/is empty
-            try:
-                chat_msg = await user.get_messages(chat_id=start_chat, message_ids=msg_id)
-            except FloodWait as e:
-                LOGGER(__name__).warning(f"FloodWait while fetching {url}. Sleeping {e.value}s.")
-                await asyncio.sleep(e.value)
-                chat_msg = await user.get_messages(chat_id=start_chat, message_ids=msg_id)
-
-            if not chat_msg:
-                skipped += 1
-                skipped_streak += 1
-                if skipped_streak >= BATCH_SIZE:
-                    await asyncio.sleep(4)
-                    skipped_streak = 0
-                continue
-
-            has_media = bool(chat_msg.media_group_id or chat_msg.media)
-            has_text  = bool(chat_msg.text or chat_msg.caption)
-            if not (has_media or has_text):
-                skipped += 1
-                skipped_streak += 1
-                if skipped_streak >= BATCH_SIZE:
-                    await asyncio.sleep(4)
-                    skipped_streak = 0
-                continue
-            skipped_streak = 0
-
-            # Spawn task - Enable Silent Mode for Batch to avoid FloodWait!
-            # Change silent=False to silent=True if you want completely silent batch
-            # But user wants progress bars. If user wants progress bars, we MUST use silent=False
-            # BUT we implemented the 25s delay in utils.py so it is SAFE now.
-            # So we set silent=False here to show bars as requested.
-            task = track_task(handle_download(bot, message, url, silent=False))
-            batch_tasks.append(task)
-
-            # Wait if batch size reached
-            if len(batch_tasks) >= BATCH_SIZE:
-                results = await asyncio.gather(*batch_tasks, return_exceptions=True)
-                for result in results:
-                    if isinstance(result, asyncio.CancelledError):
-                        await loading.delete()
-                        return await message.reply(
-                            f"**❌ Batch canceled** after processing `{downloaded}` posts."
-                        )
-                    elif isinstance(result, Exception):
-                        failed += 1
-                        LOGGER(__name__).error(f"Error: {result}")
-                    else:
-                        downloaded += 1
+            while len(in_flight) >= limit and in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                if not all([record_result(task) for task in done]):
+                    await abort()
+                    return False
+        except asyncio.CancelledError:
+            await abort()
+            raise
+        return True
+
+    # Cancels whatever is still running and records the items that managed
+    # to finish meanwhile, so the summary counts stay exact.
+    async def abort():
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.wait(in_flight)
+        for task in list(in_flight):
+            record_result(task)
 
-                batch_tasks.clear()
-                # Flood wait to be safe
-                await asyncio.sleep(PyroConf.FLOOD_WAIT_DELAY)
+    try:
+        # Items are grouped per source chat so each chat is resolved in bulk
+        # (up to 200 IDs per request) by a background prefetch stage that stays
+        # a bounded window ahead of us.
+        items_by_chat = {}
+        for item in items:
+            items_by_chat.setdefault(item.source_chat, {})[item.message_id] = item
+
+        for source_chat, chat_items in items_by_chat.items():
+            prefetched = prefetch_messages(USER_POOL, source_chat, list(chat_items))
+
+            async for msg_id, chat_msg in prefetched:
+                item = chat_items[msg_id]
+                if isinstance(chat_msg, Exception):
+                    # Its chunk could not be fetched; the retry pass gets
+                    # another go at transient errors
+                    record_failure(item, "fetch", chat_msg)
+                    continue
+                try:
+                    # Check if message exists/is empty
+                    if not chat_msg or chat_msg.empty:
+                        JOB_STORE.set_item_state(job.id, item.seq, ITEM_SKIPPED)
+                        continue
+
+                    has_media = bool(chat_msg.media_group_id or chat_msg.media)
+                    has_text  = bool(chat_msg.text or chat_msg.caption)
+                    if not (has_media or has_text):
+                        JOB_STORE.set_item_state(job.id, item.seq, ITEM_SKIPPED)
+                        continue
+
+                    # Spawn task - Enable Silent Mode for Batch to avoid FloodWait!
+                    # Change silent=False to silent=True if you want completely silent batch
+                    # But user wants progress bars. If user wants progress bars, we MUST use silent=False
+                    # BUT we implemented the 25s delay in utils.py so it is SAFE now.
+                    # So we set silent=False here to show bars as requested.
+                    task = track_task(
+                        handle_download(
+                            bot,
+                            message,
+                            item.url,
+                            silent=False,
+                            chat_message=chat_msg,
+                            target_chat_id=job.target_chat_id,
+                            checkpoint=item_checkpoint(job, item),
+                            final=not PyroConf.BATCH_RETRY_PASS
+                        )
+                    )
+                    in_flight[task] = item
+
+                    # Wait for a free slot
+                    if not await drain(window):
+                        await prefetched.aclose()
+                        return await report_batch_cancelled(message, loading, job)
+
+                except Exception as e:
+                    record_failure(item, None, e)
+
+        # Process remaining tasks
+        if not await drain(1):
+            return await report_batch_cancelled(message, loading, job)
+
+        # Retry pass: items that still failed with a transient error get one more
+        # run, fetched afresh; permanent failures (permission, not found) don't.
+        retry_items = JOB_STORE.failed_items(job.id, RETRYABLE_ERRORS) if PyroConf.BATCH_RETRY_PASS else []
+        if retry_items:
+            await edit(
+                loading,
+                f"🔁 **Retrying** `{len(retry_items)}` failed posts (job `#{job.id}`)"
+            )
+            for item in retry_items:
+                task = track_task(
+                    handle_download(
+                        bot,
+                        message,
+                        item.url,
+                        silent=False,
+                        target_chat_id=job.target_chat_id,
+                        checkpoint=item_checkpoint(job, item)
+                    )
+                )
+                in_flight[task] = item
+                if not await drain(window):
+                    return await report_batch_cancelled(message, loading, job)
+            if not await drain(1):
+                return await report_batch_cancelled(message, loading, job)
+
+        counts = JOB_STORE.item_counts(job.id)
+        failures = JOB_STORE.failure_counts(job.id)
+        await delete(loading)
+        await reply(
+            message,
+            "**✅ Batch Process Complete!**\n"
+            "━━━━━━━━━━━━━━━━━━━\n"
+            f"📥 **Processed** : `{counts.get(ITEM_CLONED, 0) + counts.get(ITEM_UPLOADED, 0)}`\n"
+            f"⏭️ **Skipped** : `{counts.get(ITEM_SKIPPED, 0)}`\n"
+            f"❌ **Failed** : `{counts.get(ITEM_FAILED, 0)}`"
+            + (
+                f"\n🔁 **Retried** : `{len(retry_items)}`" if retry_items else ""
+            )
+            + "".join(
+                f"\n   • {error_class.replace('_', ' ')}: `{count}`"
+                for error_class, count in sorted(failures.items(), key=lambda f: -f[1])
+            )
+        )
 
-        except Exception as e:
-            failed += 1
-            LOGGER(__name__).error(f"Error at {url}: {e}")
-
-    # Process remaining tasks
-    if batch_tasks:
-        results = await asyncio.gather(*batch_tasks, return_exceptions=True)
-        for result in results:
-            if isinstance(result, Exception):
-                failed += 1
-            else:
-                downloaded += 1
-
-    await loading.delete()
-    await message.reply(
-        "**✅ Batch Process Complete!**\n"
-        "━━━━━━━━━━━━━━━━━━━\n"
-        f"📥 **Processed** : `{downloaded}`\n"
-        f"⏭️ **Skipped** : `{skipped}`\n"
-        f"❌ **Failed** : `{failed}`"
+    finally:
+        # Whatever ends the batch early, no item task is left running
+        # unrecorded
+        if in_flight:
+            await abort()
+
+async def report_batch_cancelled(message: Message, loading: Message, job: Job):
+    counts = JOB_STORE.item_counts(job.id)
+    await delete(loading)
+    return await reply(
+        message,
+        f"**❌ Batch canceled** after processing "
+        f"`{counts.get(ITEM_CLONED, 0) + counts.get(ITEM_UPLOADED, 0)}` posts."
     )
 
 
 @bot.on_message(filters.command("stats") & filters.private)
 async def stats(_, message: Message):
+    import psutil  # Only /stats needs it; kept off the startup path
+
     currentTime = get_readable_time(time() - PyroConf.BOT_START_TIME)
     total, used, free = shutil.disk_usage(".")
+    disk = DISK_ADMISSION.stats()
     total = get_readable_file_size(total)
     used = get_readable_file_size(used)
     free = get_readable_file_size(free)
     sent = get_readable_file_size(psutil.net_io_counters().bytes_sent)
     recv = get_readable_file_size(psutil.net_io_counters().bytes_recv)
+    clone_cache = CLONE_STRATEGY_CACHE.stats()
+    file_cache = FILE_ID_CACHE.stats()
+    flood = RATE_LIMITER.stats()
+    sessions = USER_POOL.stats()
+    lanes = UPLOAD_LANES.stats()
+    transfers = TRANSFER_SCHEDULER.stats()
     
     stats_msg = (
         "**Bot Status**\n\n"
         f"**➜ Uptime:** `{currentTime}`\n"
-        f"**➜ Disk Free:** `{free}`\n"
+        f"**➜ Disk Free:** `{free}` (`{get_readable_file_size(disk['reserved'])}` reserved, `{disk['waiting']}` waiting)\n"
         f"**➜ Upload:** `{sent}`\n"
-        f"**➜ Download:** `{recv}`"
+        f"**➜ Download:** `{recv}`\n"
+        f"**➜ Clone Cache:** `{clone_cache['hits']}` hits / `{clone_cache['misses']}` misses "
+        f"(`{clone_cache['entries']}` pairs)\n"
+        f"**➜ File ID Cache:** `{file_cache['hits']}` hits / `{file_cache['misses']}` misses\n"
+        f"**➜ FloodWaits:** `{flood['flood_waits']}` (`{int(flood['flood_wait_seconds'])}s` total)\n"
+        f"**➜ User Sessions:** `{sessions['healthy']}` of `{sessions['sessions']}` healthy\n"
+        f"**➜ Upload Lanes:** `{lanes['healthy']}` of `{lanes['sessions']}` healthy\n"
+        f"**➜ Transfers:** `{transfers['running']}` running, `{transfers['waiting']}` waiting "
+        f"(`{transfers['users']}` users)\n"
+        f"**➜ Queued Jobs:** `{JOB_STORE.pending_jobs()}`"
     )
-    await message.reply(stats_msg)
+    await reply(message, stats_msg)
 
 
 @bot.on_message(filters.command("logs") & filters.private)
 async def logs(_, message: Message):
-    if os.path.exists("logs.txt"):
-        await message.reply_document(document="logs.txt", caption="**Logs**")
+    if os.path.exists(LOG_FILE):
+        await RATE_LIMITER.call(
+            message._client, "send", message.chat.id,
+            message.reply_document, document=LOG_FILE, caption="**Logs**"
+        )
     else:
-        await message.reply("**Not exists**")
+        await reply(message, "**Not exists**")
 
 
 @bot.on_callback_query(filters.regex("^refresh_progress$"))
@@ -614,27 +1238,57 @@ async def cancel_all_tasks(_, message: Message):
     if message.from_user.id in BATCH_STATES:
         del BATCH_STATES[message.from_user.id]
         
+    # Drop queued jobs first so the workers don't pick them up again
+    cancelled_jobs = JOB_STORE.cancel_all()
+
     for task in list(RUNNING_TASKS):
         if not task.done():
             task.cancel()
             cancelled += 1
-    await message.reply(f"**Cancelled {cancelled} running task(s).**")
+    await reply(
+        message,
+        f"**Cancelled {cancelled} running task(s) and {cancelled_jobs} queued job(s).**"
+    )
 
 
 async def initialize():
-    global download_semaphore
-    download_semaphore = asyncio.Semaphore(PyroConf.MAX_CONCURRENT_DOWNLOADS)
+    global TRANSFER_SCHEDULER, JOB_WAKEUP
+    TRANSFER_SCHEDULER = FairScheduler(
+        PyroConf.MAX_CONCURRENT_DOWNLOADS,
+        PyroConf.USER_MAX_CONCURRENT,
+        parse_user_weights(PyroConf.USER_WEIGHTS)
+    )
+    JOB_WAKEUP = asyncio.Event()
+
+    # Resumable partials older than PARTIAL_DOWNLOAD_TTL won't be retried
+    removed = sweep_stale_partials(PyroConf.PARTIAL_DOWNLOAD_TTL)
+    if removed:
+        LOGGER(__name__).info(f"Removed {removed} stale partial download file(s)")
 
 
 # -------------------------------------------------------------------------------------
 # Dummy Web Server for Render
 # -------------------------------------------------------------------------------------
 async def web_server():
+    from aiohttp import web
+
     async def handle(request):
         return web.Response(text="Bot is running!")
 
+    async def ready(request):
+        # 503 until every component is up, for deploy health checks
+        return web.json_response(STARTUP.stats(), status=200 if STARTUP.ready else 503)
+
+    async def metrics(request):
+        return web.Response(
+            text=render_metrics(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
     app = web.Application()
     app.router.add_get('/', handle)
+    app.router.add_get('/ready', ready)
+    app.router.add_get('/metrics', metrics)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', int(os.getenv('PORT', 8080)))
@@ -642,6 +1296,29 @@ async def web_server():
     LOGGER(__name__).info(f"Web server started on port {os.getenv('PORT', 8080)}")
 
 
+async def main():
+    await initialize()
+
+    # The web server and every client come up at the same time; the bot
+    # answers commands as soon as it is connected, while the user sessions
+    # may still be connecting. Queued jobs need all of them, so the workers
+    # start last.
+    clients = [bot] + UPLOAD_BOTS + USER_POOL.clients
+    STARTUP.expect("web", *(client.name for client in clients), "workers")
+    try:
+        await asyncio.gather(
+            STARTUP.start("web", web_server()),
+            *(STARTUP.start(client.name, start_client(client)) for client in clients)
+        )
+        await STARTUP.start("workers", start_job_workers())
+        await idle()
+    finally:
+        await asyncio.gather(
+            *(client.stop() for client in clients if client.is_connected),
+            return_exceptions=True
+        )
+
+
 # -------------------------------------------------------------------------------------
 # MAIN EXECUTION
 # -------------------------------------------------------------------------------------
@@ -649,19 +1326,7 @@ if __name__ == "__main__":
     try:
         LOGGER(__name__).info("Bot Started!")
         loop = asyncio.get_event_loop()
-        
-        # Initialize semaphore
-        loop.run_until_complete(initialize())
-        
-        # Start the User Client
-        user.start()
-        
-        # Start the Dummy Web Server
-        loop.run_until_complete(web_server())
-        
-        # Start the Bot Client
-        bot.run()
-        
+        loop.run_until_complete(main())
     except KeyboardInterrupt:
         pass
     except Exception as err: